@@ -0,0 +1,252 @@
+"""Загрузка истории из архивов сделок ByBit (public.bybit.com).
+
+Биржа выкладывает все спотовые сделки за день в файле
+<SYMBOL>_<YYYY-MM-DD>.csv.gz (колонки id,timestamp,price,volume,side, время
+в ms). Файлы берутся из папки (<dir>/<SYMBOL>/ или <dir>/) или скачиваются
+с зеркала <url>/<SYMBOL>/<файл>. Сделки файла группируются в
+минутные свечи OHLCV и turnover (numpy, без цикла по сделкам) и пишутся в
+хранилище из настроек, в Postgres - через COPY. Файл обрабатывается в
+памяти целиком, файлы - по одному.
+
+Минуты дня без сделок получают свечу без объема по цене предыдущего
+закрытия, чтобы поиск пропусков не ставил их на загрузку через REST
+(--no-fill - не заполнять). Дни без пропусков в хранилище пропускаются
+(--force - импортировать все). Нужен pyarrow.
+
+    python archive.py --tickers BTCUSDT --dir trades --from 2022-01-01
+    python archive.py --tickers BTCUSDT --url https://public.bybit.com/spot --from 2022-01-01 --to 2022-12-31
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import time
+from datetime import datetime
+
+from minutestore import _numpy
+from sinks import make_sink
+from timeutil import UTC, utc, utc_now, ms_to_datetime, datetime_to_ms
+
+ARCHIVE_URL = "https://public.bybit.com/spot"
+ARCHIVE_NAME = "{symbol}_{day}.csv.gz"
+ARCHIVE_THREADS = 4  # тикеров одновременно
+DOWNLOAD_CHUNK = 1 << 20
+DOWNLOAD_TIMEOUT = 600  # секунды на один файл
+MINUTE_MS = 60000
+DAY_MS = 1440 * MINUTE_MS
+
+
+def _pyarrow_csv():
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        raise ImportError("Для импорта архивов сделок установите pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def read_trades(path):
+    """Сделки архива: (epoch ms int64, цена, объем) - numpy массивы"""
+    pa = _pyarrow_csv()
+    table = pa.csv.read_csv(path, convert_options=pa.csv.ConvertOptions(
+        include_columns=['timestamp', 'price', 'volume'],
+        column_types={'timestamp': pa.int64(), 'price': pa.float64(), 'volume': pa.float64()}
+    ))
+    return (table['timestamp'].to_numpy(), table['price'].to_numpy(),
+            table['volume'].to_numpy())
+
+
+def minute_bars(timestamps, prices, sizes, first_ms=None, last_ms=None, prev_close=None):
+    """Минутные свечи из сделок: (epoch ms, строки open, high, low, close, volume, turnover).
+
+    С first_ms/last_ms сделки вне [first_ms, last_ms] отбрасываются, а минуты
+    без сделок заполняются свечой без объема по предыдущему закрытию (до
+    первой сделки - по prev_close, если он известен).
+    """
+    np = _numpy()
+    if first_ms is not None:
+        inside = (timestamps >= first_ms) & (timestamps < last_ms + MINUTE_MS)
+        timestamps, prices, sizes = timestamps[inside], prices[inside], sizes[inside]
+
+    order = np.argsort(timestamps, kind='stable')
+    timestamps, prices, sizes = timestamps[order], prices[order], sizes[order]
+    minutes = timestamps // MINUTE_MS * MINUTE_MS
+    if len(minutes):
+        starts = np.flatnonzero(np.concatenate(([True], minutes[1:] != minutes[:-1])))
+        ends = np.append(starts[1:], len(minutes)) - 1
+        keys = minutes[starts]
+        values = np.column_stack([
+            prices[starts],
+            np.maximum.reduceat(prices, starts),
+            np.minimum.reduceat(prices, starts),
+            prices[ends],
+            np.add.reduceat(sizes, starts),
+            np.add.reduceat(prices * sizes, starts),
+        ])
+    else:
+        keys, values = minutes, np.empty((0, 6))
+    if first_ms is None:
+        return keys, values
+
+    grid = np.arange(first_ms, last_ms + MINUTE_MS, MINUTE_MS, dtype='int64')
+    filled = np.full((len(grid), 6), np.nan)
+    filled[(keys - first_ms) // MINUTE_MS] = values
+    traded = ~np.isnan(filled[:, 3])
+    # Индекс последней минуты со сделками для каждой минуты сетки
+    last_traded = np.maximum.accumulate(np.where(traded, np.arange(len(grid)), -1))
+    previous = np.where(last_traded >= 0, filled[np.maximum(last_traded, 0), 3],
+                        np.nan if prev_close is None else prev_close)
+    empty = ~traded
+    filled[empty, :4] = previous[empty, None]
+    filled[empty, 4:] = 0.0
+    keep = ~np.isnan(filled[:, 3])
+    return grid[keep], filled[keep]
+
+
+def day_bars(path, day_ms, prev_close=None, fill=True):
+    """Свечи дня из файла архива"""
+    timestamps, prices, sizes = read_trades(path)
+    if fill:
+        return minute_bars(timestamps, prices, sizes, day_ms, day_ms + DAY_MS - MINUTE_MS, prev_close)
+    return minute_bars(timestamps, prices, sizes)
+
+
+def local_archives(root, symbol):
+    """{начало дня, epoch ms: путь к файлу} архивов тикера в root/<SYMBOL>/ и root/"""
+    pattern = re.compile(rf'^{re.escape(symbol)}_(\d{{4}}-\d{{2}}-\d{{2}})\.csv\.gz$')
+    files = {}
+    for directory in (os.path.join(root, symbol), root):
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            match = pattern.match(name)
+            if match:
+                day = datetime.strptime(match.group(1), '%Y-%m-%d').replace(tzinfo=UTC)
+                files.setdefault(datetime_to_ms(day), os.path.join(directory, name))
+    return files
+
+
+async def download_archive(session, url, symbol, day_ms, path):
+    """Скачивает файл дня с зеркала в path. False, если файла за этот день нет"""
+    name = ARCHIVE_NAME.format(symbol=symbol, day=ms_to_datetime(day_ms).strftime('%Y-%m-%d'))
+    file_url = f"{url.rstrip('/')}/{symbol}/{name}"
+    async with session.get(file_url) as response:
+        if response.status == 404:
+            return False
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {file_url}")
+        with open(path, 'wb') as f:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK):
+                f.write(chunk)
+    return True
+
+
+async def needed_days(sink, symbol, first_day_ms, last_day_ms):
+    """Начала дней, в которых у хранилища есть пропуски"""
+    gaps = await sink.missing_periods(symbol, ms_to_datetime(first_day_ms),
+                                      ms_to_datetime(last_day_ms + DAY_MS - MINUTE_MS))
+    days = set()
+    for start, end in gaps:
+        days.update(range(datetime_to_ms(start) // DAY_MS * DAY_MS, datetime_to_ms(end) + 1, DAY_MS))
+    return days
+
+
+async def import_symbol(sink, symbol, days, directory=None, url=None, session=None, fill=True):
+    """Импортирует дни тикера по порядку. Возвращает (дней, свечей)"""
+    files = local_archives(directory, symbol) if directory else {}
+    imported = rows = 0
+    prev_close = previous_day_ms = None
+    with tempfile.TemporaryDirectory(prefix='bybit_archive_') as workdir:
+        for day_ms in sorted(days):
+            # Закрытие переносится только с предыдущего дня: дни без пропусков в
+            # хранилище не импортируются, и их последняя цена здесь неизвестна
+            if previous_day_ms != day_ms - DAY_MS:
+                prev_close = None
+            previous_day_ms = day_ms
+            path = files.get(day_ms)
+            if path is None and url:
+                path = os.path.join(workdir, f"{symbol}.csv.gz")
+                if not await download_archive(session, url, symbol, day_ms, path):
+                    path = None
+            if path is None:
+                prev_close = None
+                continue
+
+            started = time.perf_counter()
+            timestamps, values = await asyncio.to_thread(day_bars, path, day_ms, prev_close, fill)
+            prev_close = None
+            if len(timestamps):
+                await sink.write_arrays(symbol, timestamps, values)
+                prev_close = float(values[-1, 3])
+            imported += 1
+            rows += len(timestamps)
+            logging.info(f"{symbol} {ms_to_datetime(day_ms):%Y-%m-%d}: "
+                         f"{len(timestamps)} свечей за {time.perf_counter() - started:.2f} с")
+    return imported, rows
+
+
+async def import_archives(settings, symbols, start, end, directory=None, url=None, force=False, fill=True):
+    """Импортирует архивы сделок за дни [start, end] в хранилище из настроек"""
+    import aiohttp
+
+    first_day = datetime_to_ms(utc(start)) // DAY_MS * DAY_MS
+    last_day = min(datetime_to_ms(utc(end)), datetime_to_ms(utc_now()) - DAY_MS) // DAY_MS * DAY_MS
+    sink = make_sink(settings)
+    semaphore = asyncio.Semaphore(ARCHIVE_THREADS)
+    await sink.open(ARCHIVE_THREADS)
+    try:
+        await sink.bootstrap(symbols)
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT)) as session:
+
+            async def run_symbol(symbol):
+                async with semaphore:
+                    days = set(range(first_day, last_day + 1, DAY_MS))
+                    if not force:
+                        days &= await needed_days(sink, symbol, first_day, last_day)
+                    try:
+                        imported, rows = await import_symbol(sink, symbol, days, directory, url, session, fill)
+                    except Exception as e:
+                        logging.error(f"Ошибка импорта {symbol}: {str(e)}")
+                        print(f"{symbol}: ошибка импорта: {str(e)}")
+                        return False
+                    print(f"{symbol}: дней с пропусками {len(days)}, импортировано дней {imported}, свечей {rows}")
+                    return True
+
+            results = await asyncio.gather(*(run_symbol(symbol) for symbol in symbols))
+    finally:
+        await sink.close()
+    return all(results)
+
+
+def main():
+    from config import load_settings
+
+    parser = argparse.ArgumentParser(description="Импорт архивов сделок ByBit в минутные свечи")
+    parser.add_argument('--tickers', nargs='+', help="по умолчанию сохраненные в settings.ini")
+    parser.add_argument('--dir', default=None, help="папка с файлами <SYMBOL>_<YYYY-MM-DD>.csv.gz")
+    parser.add_argument('--url', default=None,
+                        help=f"зеркало архивов, если файла нет в --dir (например {ARCHIVE_URL})")
+    parser.add_argument('--from', dest='start_date', default='2021-08-01', help="первый день (UTC), YYYY-MM-DD")
+    parser.add_argument('--to', dest='end_date', default=None, help="последний день (UTC), YYYY-MM-DD")
+    parser.add_argument('--sink', default=None, help="хранилище (по умолчанию из settings.ini)")
+    parser.add_argument('--force', action='store_true', help="импортировать и дни без пропусков")
+    parser.add_argument('--no-fill', action='store_true', help="не заполнять минуты без сделок")
+    args = parser.parse_args()
+    if not args.dir and not args.url:
+        parser.error("нужен --dir или --url")
+
+    settings = load_settings()
+    if args.sink:
+        settings['sink'] = args.sink
+    symbols = args.tickers or settings['selected_tickers']
+    start = utc(datetime.strptime(args.start_date, '%Y-%m-%d'))
+    end = utc(datetime.strptime(args.end_date, '%Y-%m-%d')) if args.end_date else utc_now()
+    ok = asyncio.run(import_archives(settings, symbols, start, end, args.dir, args.url,
+                                     args.force, not args.no_fill))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
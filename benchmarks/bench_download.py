@@ -0,0 +1,296 @@
+"""Сквозной бенчмарк загрузки против локального эмулятора биржи.
+
+Эмулятор (mock_bybit.py) запускается отдельным процессом, каждый сценарий -
+тоже в отдельном процессе, чтобы пиковая память (RSS) не смешивалась.
+Данные пишутся в память (--sink memory), в схему bybit_bench базы из
+settings.ini (--sink postgres, таблицы схемы пересоздаются), в набор
+Parquet файлов (--sink parquet) или в хранилище mmap (--sink mmap), папка
+--store-dir очищается.
+
+Сценарии:
+    backfill    - пустое хранилище, полная загрузка периода
+    fragmented  - период загружен с дырами по 17 минут каждые --gap-every часов
+    sync        - период загружен до (сейчас - --behind минут), режим --sync
+
+    python benchmarks/bench_download.py --symbols 10 --days 2 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import DownloadEngine  # noqa: E402
+from sinks import KlineSink, PostgresSink, ParquetSink, MmapSink, table_name  # noqa: E402
+from timeutil import split_by_month, ms_to_datetime, datetime_to_ms, utc_now  # noqa: E402
+from metrics import ROWS_WRITTEN  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ('backfill', 'fragmented', 'sync')
+BENCH_SCHEMA = 'bybit_bench'
+HOLE_MINUTES = 17
+SEED_BATCH = 10_000
+BENCH_SINKS = ('memory', 'postgres', 'parquet', 'mmap')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def seed_ranges(scenario, start, end, args):
+    """Периоды, которые должны лежать в хранилище до начала сценария"""
+    if scenario == 'backfill':
+        return []
+    if scenario == 'sync':
+        return [(start, end - timedelta(minutes=args.behind))]
+
+    ranges = []
+    current = start
+    step = timedelta(hours=args.gap_every)
+    while current < end:
+        hole_start = min(current + step, end)
+        ranges.append((current, hole_start - timedelta(minutes=1)))
+        current = hole_start + timedelta(minutes=HOLE_MINUTES)
+    return ranges
+
+
+class BenchEngine(DownloadEngine):
+    """Считает запросы и задержку каждого вызова fetch_klines (с повторами)"""
+
+    def __init__(self, settings, sink):
+        super().__init__(settings, sink=sink)
+        self.latencies = []
+
+    async def fetch_klines(self, session, symbol, start_time=None, end_time=None, interval='1'):
+        started = time.perf_counter()
+        try:
+            return await super().fetch_klines(session, symbol, start_time, end_time, interval)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+
+class MemorySink(KlineSink):
+    """Хранилище в памяти вместо Postgres"""
+
+    def __init__(self):
+        self.store = {}
+
+    async def ensure_table(self, symbol):
+        self.store.setdefault(symbol, {})
+
+    async def missing_periods(self, symbol, start_date, end_date):
+        table = self.store.get(symbol)
+        if table is None:
+            return split_by_month(start_date, end_date)
+
+        missing_periods = []
+        gap_start = prev = None
+        current = start_date
+        while current <= end_date:
+            if current not in table:
+                if gap_start is None:
+                    gap_start = current
+                prev = current
+            elif gap_start is not None:
+                missing_periods.append((gap_start, prev))
+                gap_start = None
+            current += timedelta(minutes=1)
+        if gap_start is not None:
+            missing_periods.append((gap_start, prev))
+        return missing_periods
+
+    async def watermarks(self, symbols):
+        return {symbol: max(self.store[symbol]) for symbol in symbols if self.store.get(symbol)}
+
+    async def write(self, symbol, klines):
+        table = self.store.setdefault(symbol, {})
+        for kline in klines:
+            table[ms_to_datetime(kline[0])] = tuple(float(value) for value in kline[1:7])
+
+
+def make_bench_sink(args, settings):
+    if args.sink == 'postgres':
+        return PostgresSink(dict(settings, schema=BENCH_SCHEMA))
+    if args.sink == 'parquet':
+        return ParquetSink(args.store_dir)
+    if args.sink == 'mmap':
+        return MmapSink(args.store_dir)
+    return MemorySink()
+
+
+async def seed(sink, symbols, ranges):
+    """Очищает тестовое хранилище и заполняет его свечами за ranges"""
+    if isinstance(sink, (ParquetSink, MmapSink)):
+        shutil.rmtree(sink.root, ignore_errors=True)
+    await sink.open(4)
+    try:
+        for symbol in symbols:
+            if isinstance(sink, PostgresSink):
+                async with sink.acquire() as conn:
+                    await conn.execute(f"DROP TABLE IF EXISTS {sink.schema}.{table_name(symbol)}")
+                sink.tables.pop(table_name(symbol), None)
+            if not ranges:
+                continue
+            await sink.ensure_table(symbol)
+            for start, end in ranges:
+                klines = [[str(ms), '1', '1', '1', '1', '1', '1']
+                          for ms in range(datetime_to_ms(start), datetime_to_ms(end) + 1, 60000)]
+                for i in range(0, len(klines), SEED_BATCH):
+                    await sink.write(symbol, klines[i:i + SEED_BATCH])
+    finally:
+        await sink.close()
+
+
+async def run_scenario(scenario, args):
+    from config import load_settings
+
+    settings = load_settings() if args.sink == 'postgres' else {}
+    settings = dict(settings, threads=args.threads)
+    engine = BenchEngine(settings, make_bench_sink(args, settings))
+    engine.kline_url = f"http://127.0.0.1:{args.port}/v5/market/kline"
+
+    end = utc_now().replace(second=0, microsecond=0) - timedelta(minutes=1)
+    start = end - timedelta(days=args.days)
+    symbols = [f"MOCK{i:03d}USDT" for i in range(args.symbols)]
+    await seed(engine.sink, symbols, seed_ranges(scenario, start, end, args))
+
+    rows_before = ROWS_WRITTEN.get()
+    started = time.perf_counter()
+    if scenario == 'sync':
+        success = await engine.sync(symbols, start, lookback_minutes=args.lookback)
+    else:
+        success = await engine.run(symbols, start, end)
+    elapsed = time.perf_counter() - started
+
+    rows = ROWS_WRITTEN.get() - rows_before
+    return {
+        'scenario': scenario,
+        'success': success,
+        'seconds': elapsed,
+        'requests': len(engine.latencies),
+        'requests_per_sec': len(engine.latencies) / elapsed if elapsed else 0.0,
+        'rows': int(rows),
+        'rows_per_sec': rows / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(engine.latencies, 0.50) * 1000,
+        'p99_ms': percentile(engine.latencies, 0.99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_server(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Эмулятор биржи не запустился")
+
+
+def scenario_args(args):
+    return [
+        '--symbols', str(args.symbols), '--days', str(args.days), '--threads', str(args.threads),
+        '--gap-every', str(args.gap_every), '--behind', str(args.behind),
+        '--lookback', str(args.lookback), '--port', str(args.port),
+        '--sink', args.sink, '--store-dir', args.store_dir,
+    ]
+
+
+def print_report(results):
+    header = f"{'scenario':11} {'ok':3} {'sec':>8} {'req':>7} {'req/s':>8} {'rows':>10} {'rows/s':>10} " \
+             f"{'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>7}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        rss = f"{r['peak_rss_mb']:7.1f}" if r['peak_rss_mb'] is not None else f"{'-':>7}"
+        print(f"{r['scenario']:11} {'да' if r['success'] else 'нет':3} {r['seconds']:8.2f} {r['requests']:7d} "
+              f"{r['requests_per_sec']:8.1f} {r['rows']:10d} {r['rows_per_sec']:10.0f} "
+              f"{r['p50_ms']:8.1f} {r['p99_ms']:8.1f} {rss}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--days', type=float, default=2)
+    parser.add_argument('--threads', type=int, default=5)
+    parser.add_argument('--gap-every', type=float, default=6, help="часов между дырами (fragmented)")
+    parser.add_argument('--behind', type=int, default=180, help="минут отставания (sync)")
+    parser.add_argument('--lookback', type=int, default=60, help="окно пересмотра (sync)")
+    parser.add_argument('--latency', type=float, default=0.02, help="задержка эмулятора, секунды")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--rate-limit', type=int, default=600)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--stall', type=float, default=5.0)
+    parser.add_argument('--sink', choices=BENCH_SINKS, default='memory', help="куда писать свечи")
+    parser.add_argument('--store-dir', default=os.path.join(tempfile.gettempdir(), 'bybit_bench_store'),
+                        help="папка для --sink parquet/mmap (очищается)")
+    parser.add_argument('--json', action='store_true', help="вывести результаты в JSON")
+    parser.add_argument('--port', type=int, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--run-scenario', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(asyncio.run(run_scenario(args.run_scenario, args))))
+        return
+
+    args.port = free_port()
+    mock = subprocess.Popen([
+        sys.executable, os.path.join(ROOT, 'benchmarks', 'mock_bybit.py'),
+        '--port', str(args.port), '--latency', str(args.latency), '--jitter', str(args.jitter),
+        '--rate-limit', str(args.rate_limit), '--error-rate', str(args.error_rate),
+        '--stall', str(args.stall),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_server(args.port)
+        results = []
+        for scenario in args.scenarios:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run-scenario', scenario] + scenario_args(args),
+                capture_output=True, text=True, check=True, cwd=ROOT
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Поиск пропусков и чтение периода в хранилище mmap против Parquet и Postgres.
+
+Синтетическая история на --minutes минут с дырой в --hole минут каждые
+--gap-every минут пишется во временные хранилища mmap и Parquet. Замеряется:
+
+    gap scan - поиск пропусков по всей истории (как при check_missing_data);
+    range    - --reads случайных окон по --window минут;
+    full     - чтение всей истории по колонке close.
+
+С ключом --postgres поиск пропусков сравнивается с запросом generate_series
+по таблице bybit_bench.klines_benchusdt (создается bench_read.py --seed).
+
+    python benchmarks/bench_minutestore.py --minutes 2000000
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from minutestore import MinuteStore, MINUTE_MS  # noqa: E402
+from sinks import ParquetSink, PostgresSink  # noqa: E402
+from timeutil import ms_to_datetime  # noqa: E402
+
+SYMBOL = 'BENCHUSDT'
+START_MS = 1577836800000  # 2020-01-01 UTC
+WRITE_BATCH = 100_000
+
+
+def timed(func, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def synthetic(minutes, gap_every, hole):
+    index = np.arange(minutes, dtype='int64')
+    index = index[index % gap_every >= hole] if hole else index
+    timestamps = START_MS + index * MINUTE_MS
+    values = np.column_stack([100 + np.sin(index / 720.0)] * 4 + [index % 1000.0, (index % 1000) * 100.0])
+    return timestamps, values
+
+
+def klines(timestamps, values):
+    return [[str(ts)] + row for ts, row in zip(timestamps.tolist(), values.tolist())]
+
+
+async def bench_parquet(root, timestamps, values, end_ms, reads, window):
+    sink = ParquetSink(root)
+    await sink.open(1)
+    for i in range(0, len(timestamps), WRITE_BATCH):
+        await sink.write(SYMBOL, klines(timestamps[i:i + WRITE_BATCH], values[i:i + WRITE_BATCH]))
+    await sink.close()
+
+    start, end = ms_to_datetime(START_MS), ms_to_datetime(end_ms)
+    started = time.perf_counter()
+    gaps = await sink.missing_periods(SYMBOL, start, end)
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    await sink.missing_periods(SYMBOL, start, end)
+    warm = time.perf_counter() - started
+    return cold, warm, len(gaps)
+
+
+async def bench_postgres(end_ms):
+    from config import load_settings
+
+    sink = PostgresSink(dict(load_settings(), schema='bybit_bench'))
+    await sink.open(1)
+    try:
+        started = time.perf_counter()
+        gaps = await sink.missing_periods(SYMBOL, ms_to_datetime(START_MS), ms_to_datetime(end_ms))
+        return time.perf_counter() - started, len(gaps)
+    finally:
+        await sink.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=int, default=1_000_000)
+    parser.add_argument('--gap-every', type=int, default=10_000)
+    parser.add_argument('--hole', type=int, default=17)
+    parser.add_argument('--reads', type=int, default=1000)
+    parser.add_argument('--window', type=int, default=1440)
+    parser.add_argument('--no-parquet', action='store_true', help="не сравнивать с Parquet")
+    parser.add_argument('--postgres', action='store_true', help="сравнить с поиском пропусков в Postgres")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_minutestore_')
+    try:
+        timestamps, values = synthetic(args.minutes, args.gap_every, args.hole)
+        end_ms = START_MS + (args.minutes - 1) * MINUTE_MS
+
+        store = MinuteStore(os.path.join(workdir, 'mmap'), SYMBOL)
+        write_sec, _ = timed(lambda: [store.write(timestamps[i:i + WRITE_BATCH], values[i:i + WRITE_BATCH])
+                                      for i in range(0, len(timestamps), WRITE_BATCH)])
+        store.flush()
+        print(f"{'rows':24} {len(timestamps):>12d}")
+        print(f"{'mmap write, rows/s':24} {len(timestamps) / write_sec:12.0f}")
+
+        scan_sec, gaps = timed(lambda: store.missing(START_MS, end_ms), repeat=5)
+        print(f"{'mmap gap scan, ms':24} {scan_sec * 1000:12.2f}  ({len(gaps)} пропусков)")
+
+        offsets = [random.randrange(0, args.minutes - args.window) for _ in range(args.reads)]
+
+        def read_windows():
+            total = 0.0
+            for offset in offsets:
+                chunk = store.read(START_MS + offset * MINUTE_MS, START_MS + (offset + args.window) * MINUTE_MS, ('close',))
+                total += float(np.nansum(chunk['close']))
+            return total
+
+        range_sec, _ = timed(read_windows)
+        print(f"{'mmap range read, us':24} {range_sec / args.reads * 1e6:12.1f}  (окно {args.window} мин)")
+
+        full_sec, _ = timed(lambda: float(np.nansum(store.read(START_MS, end_ms + MINUTE_MS, ('close',))['close'])))
+        print(f"{'mmap full read, rows/s':24} {args.minutes / full_sec:12.0f}")
+        store.close()
+
+        if not args.no_parquet:
+            cold, warm, parquet_gaps = asyncio.run(bench_parquet(
+                os.path.join(workdir, 'parquet'), timestamps, values, end_ms, args.reads, args.window))
+            print(f"{'parquet gap scan, ms':24} {cold * 1000:12.2f}  (повторно {warm * 1000:.2f}, "
+                  f"{parquet_gaps} пропусков)")
+
+        if args.postgres:
+            pg_sec, pg_gaps = asyncio.run(bench_postgres(end_ms))
+            print(f"{'postgres gap scan, ms':24} {pg_sec * 1000:12.2f}  ({pg_gaps} пропусков)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
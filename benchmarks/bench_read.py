@@ -0,0 +1,131 @@
+"""Скорость чтения сохраненных свечей: COPY binary, серверный курсор и fetch целиком.
+
+Нужен Postgres из settings.ini. С ключом --seed в схеме bybit_bench
+создается таблица klines_benchusdt на --minutes минут синтетических данных.
+Каждый способ чтения выполняется в отдельном процессе, чтобы пиковая
+память (RSS) не смешивалась.
+
+    python benchmarks/bench_read.py --seed --minutes 2000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import load_settings  # noqa: E402
+from reader import KlineReader, COLUMNS  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_SCHEMA = 'bybit_bench'
+SYMBOL = 'BENCHUSDT'
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+METHODS = ('copy', 'cursor', 'fetch')
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+async def seed(settings, minutes):
+    import asyncpg
+
+    conn = await asyncpg.connect(host=settings['host'], port=settings['port'], user=settings['user'],
+                                 password=settings['password'], database=settings['database'])
+    try:
+        table = f"{BENCH_SCHEMA}.klines_{SYMBOL.lower()}"
+        await conn.execute(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}")
+        await conn.execute(f"DROP TABLE IF EXISTS {table}")
+        await conn.execute(f"""
+            CREATE TABLE {table} (
+                timestamp TIMESTAMPTZ PRIMARY KEY,
+                open DECIMAL, high DECIMAL, low DECIMAL, close DECIMAL, volume DECIMAL, turnover DECIMAL
+            )
+        """)
+        await conn.execute(f"""
+            INSERT INTO {table}
+            SELECT $1::timestamptz + make_interval(mins => i),
+                   100 + sin(i / 720.0), 100.5 + sin(i / 720.0), 99.5 + sin(i / 720.0),
+                   100 + cos(i / 720.0), i % 1000, (i % 1000) * 100
+            FROM generate_series(0, $2 - 1) AS i
+        """, START, minutes)
+        await conn.execute(f"ANALYZE {table}")
+    finally:
+        await conn.close()
+
+
+async def run_method(method, settings, minutes, chunk_size):
+    end = START + timedelta(minutes=minutes)
+    rows = 0
+    started = time.perf_counter()
+
+    if method == 'fetch':
+        # Как раньше в бэктестерах: все строки целиком, затем построчно в списки
+        import asyncpg
+        conn = await asyncpg.connect(host=settings['host'], port=settings['port'], user=settings['user'],
+                                     password=settings['password'], database=settings['database'])
+        try:
+            records = await conn.fetch(
+                f"SELECT timestamp, {', '.join(COLUMNS)} FROM {BENCH_SCHEMA}.klines_{SYMBOL.lower()} "
+                f"WHERE timestamp >= $1 AND timestamp < $2 ORDER BY timestamp", START, end)
+            table = {column: [] for column in ('timestamp',) + COLUMNS}
+            for record in records:
+                for column in table:
+                    table[column].append(record[column])
+            rows = len(records)
+        finally:
+            await conn.close()
+    else:
+        async with KlineReader(settings, chunk_size=chunk_size, method=method) as reader:
+            async for chunk in reader.read(SYMBOL, START, end):
+                rows += len(chunk['timestamp'])
+
+    elapsed = time.perf_counter() - started
+    return {'method': method, 'rows': rows, 'seconds': elapsed,
+            'rows_per_sec': rows / elapsed if elapsed else 0.0, 'peak_rss_mb': peak_rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=100_000)
+    parser.add_argument('--methods', nargs='+', choices=METHODS, default=list(METHODS))
+    parser.add_argument('--seed', action='store_true', help="пересоздать тестовую таблицу")
+    parser.add_argument('--run-method', choices=METHODS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    settings = dict(load_settings(), schema=BENCH_SCHEMA)
+    if args.run_method:
+        print(json.dumps(asyncio.run(run_method(args.run_method, settings, args.minutes, args.chunk_size))))
+        return
+
+    if args.seed:
+        asyncio.run(seed(settings, args.minutes))
+
+    print(f"{'method':8} {'rows':>10} {'sec':>8} {'rows/s':>12} {'RSS MB':>8}")
+    for method in args.methods:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-method', method,
+             '--minutes', str(args.minutes), '--chunk-size', str(args.chunk_size)],
+            capture_output=True, text=True, check=True, cwd=ROOT
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        rss = f"{r['peak_rss_mb']:8.1f}" if r['peak_rss_mb'] is not None else f"{'-':>8}"
+        print(f"{r['method']:8} {r['rows']:10d} {r['seconds']:8.2f} {r['rows_per_sec']:12.0f} {rss}")
+
+
+if __name__ == '__main__':
+    main()
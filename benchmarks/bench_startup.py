@@ -0,0 +1,106 @@
+"""Замер времени запуска в GUI и headless режимах.
+
+Каждый замер выполняется в отдельном процессе, чтобы учитывать импорт модулей.
+GUI запускается с QT_QPA_PLATFORM=offscreen и кэшем тикеров, окно считается
+готовым после первой отрисовки. Сеть и база данных не используются.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADLESS_SNIPPET = """
+import sys, time
+t0 = time.perf_counter()
+import ByBitDownloader
+from config import load_settings
+from engine import DownloadEngine
+DownloadEngine(load_settings())
+elapsed = time.perf_counter() - t0
+heavy = [m for m in ('PyQt5', 'aiohttp', 'asyncpg') if m in sys.modules]
+print(elapsed, ','.join(heavy))
+"""
+
+GUI_SNIPPET = """
+import sys, time
+t0 = time.perf_counter()
+import ByBitDownloader
+from PyQt5.QtWidgets import QApplication
+from qasync import QEventLoop
+import asyncio
+app = QApplication(sys.argv)
+loop = QEventLoop(app)
+asyncio.set_event_loop(loop)
+from gui import MainWindow
+window = MainWindow()
+window.show()
+app.processEvents()
+elapsed = time.perf_counter() - t0
+heavy = [m for m in ('aiohttp', 'asyncpg') if m in sys.modules]
+print(elapsed, ','.join(heavy), window.tickers_table.rowCount())
+"""
+
+
+def make_ticker_cache(path, count):
+    tickers = [
+        {'symbol': f"T{i:04d}USDT", 'volume24h': str(i * 10.5),
+         'price24hPcnt': '0.01', 'turnover24h': str(i * 100.25)}
+        for i in range(count)
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'saved_at': time.time(), 'tickers': tickers}, f)
+
+
+def run_snippet(snippet, workdir, env):
+    env = dict(env, PYTHONPATH=ROOT)
+    t0 = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', snippet], cwd=workdir, env=env,
+                            capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "failed")
+    fields = result.stdout.split()
+    return wall, float(fields[0]), fields[1:]
+
+
+def report(name, samples, extra):
+    walls = [s[0] for s in samples]
+    inner = [s[1] for s in samples]
+    print(f"{name:9} process: median {statistics.median(walls) * 1000:7.1f} ms, "
+          f"min {min(walls) * 1000:7.1f} ms | in-process: median {statistics.median(inner) * 1000:7.1f} ms"
+          f" | {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--tickers', type=int, default=600, help="размер кэша тикеров для GUI")
+    parser.add_argument('--skip-gui', action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        make_ticker_cache(os.path.join(workdir, 'tickers_cache.json'), args.tickers)
+        env = dict(os.environ)
+
+        samples = [run_snippet(HEADLESS_SNIPPET, workdir, env) for _ in range(args.runs)]
+        heavy = samples[-1][2][0] if samples[-1][2] else ''
+        report('headless', samples, f"тяжелые модули при старте: {heavy or 'нет'}")
+
+        if not args.skip_gui:
+            env['QT_QPA_PLATFORM'] = 'offscreen'
+            samples = [run_snippet(GUI_SNIPPET, workdir, env) for _ in range(args.runs)]
+            fields = samples[-1][2]
+            heavy, rows = (fields[0], fields[1]) if len(fields) == 2 else ('', fields[0])
+            report('gui', samples, f"строк из кэша: {rows}, сеть/БД при старте: {heavy or 'нет'}")
+
+
+if __name__ == '__main__':
+    main()
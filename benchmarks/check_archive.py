@@ -0,0 +1,166 @@
+"""Сверка свечей archive.py с простой агрегацией сделок на чистом Python.
+
+Маленькие архивы сделок лежат в benchmarks/fixtures/archive/ (дни
+2024-03-01, 2024-03-02 и 2024-03-04: сделки не по порядку, несколько сделок
+в минуте, минуты без сделок, сделка чужого дня). Проверяется:
+
+    day_bars    - свечи каждого файла (с заполнением и без) против разбора
+                  csv/gzip и группировки по минутам в цикле;
+    import      - import_symbol по этим дням (03-03 как будто без пропусков в
+                  хранилище): закрытие переносится только на соседний день.
+
+    python benchmarks/check_archive.py
+    python benchmarks/check_archive.py --write-fixtures   # пересоздать архивы
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import math
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from archive import ARCHIVE_NAME, DAY_MS, MINUTE_MS, day_bars, import_symbol  # noqa: E402
+from sinks import KlineSink  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures', 'archive')
+SYMBOL = 'BENCHUSDT'
+DAYS = {'2024-03-01': 1709251200000, '2024-03-02': 1709337600000, '2024-03-04': 1709510400000}
+TRADES_PER_DAY = 300
+QUIET_MINUTES = 10  # первые минуты дня без сделок
+
+
+def write_fixtures():
+    os.makedirs(FIXTURES, exist_ok=True)
+    rng = random.Random(2024)
+    trade_id = 1
+    for day, day_ms in DAYS.items():
+        # Сделки в первые часы дня, по нескольку на минуту, и одна сделка предыдущего дня
+        times = sorted(day_ms + rng.randrange(QUIET_MINUTES * MINUTE_MS, 180 * MINUTE_MS)
+                       for _ in range(TRADES_PER_DAY))
+        times.append(day_ms - 1500)
+        rows = []
+        price = 60000.0 + rng.uniform(-500, 500)
+        for ts in times:
+            price = round(price + rng.uniform(-5, 5), 2)
+            rows.append([trade_id, ts, price, round(rng.uniform(0.0001, 0.5), 6), rng.choice(('buy', 'sell'))])
+            trade_id += 1
+        rng.shuffle(rows)
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator='\n')
+        writer.writerow(['id', 'timestamp', 'price', 'volume', 'side'])
+        writer.writerows(rows)
+        path = os.path.join(FIXTURES, ARCHIVE_NAME.format(symbol=SYMBOL, day=day))
+        with open(path, 'wb') as f, gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as gz:
+            gz.write(text.getvalue().encode())
+        print(f"{path}: {len(rows)} сделок")
+
+
+def reference_bars(path, day_ms, prev_close=None, fill=True):
+    """[(epoch ms, open, high, low, close, volume, turnover)] - группировка в цикле"""
+    with gzip.open(path, 'rt', newline='') as f:
+        trades = [(int(row['timestamp']), float(row['price']), float(row['volume'])) for row in csv.DictReader(f)]
+    trades.sort(key=lambda trade: trade[0])
+    if fill:
+        trades = [trade for trade in trades if day_ms <= trade[0] < day_ms + DAY_MS]
+
+    minutes = {}
+    for ts, price, size in trades:
+        minute = ts // MINUTE_MS * MINUTE_MS
+        bar = minutes.get(minute)
+        if bar is None:
+            minutes[minute] = [price, price, price, price, size, price * size]
+        else:
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+            bar[3] = price
+            bar[4] += size
+            bar[5] += price * size
+    if not fill:
+        return [(minute, *bar) for minute, bar in sorted(minutes.items())]
+
+    bars = []
+    close = prev_close
+    for minute in range(day_ms, day_ms + DAY_MS, MINUTE_MS):
+        if minute in minutes:
+            bars.append((minute, *minutes[minute]))
+            close = minutes[minute][3]
+        elif close is not None:
+            bars.append((minute, close, close, close, close, 0.0, 0.0))
+    return bars
+
+
+def compare(name, ours, expected):
+    """Список расхождений свечей archive.py с эталоном"""
+    if len(ours) != len(expected):
+        return [f"{name}: свечей {len(ours)}, ожидалось {len(expected)}"]
+    problems = []
+    for got, want in zip(ours, expected):
+        if got[0] != want[0] or not all(math.isclose(a, b, rel_tol=1e-12, abs_tol=1e-12)
+                                        for a, b in zip(got[1:], want[1:])):
+            problems.append(f"{name}: {got} != {want}")
+    return problems[:5]
+
+
+class CollectSink(KlineSink):
+    def __init__(self):
+        self.bars = {}
+
+    async def write(self, symbol, klines):
+        self.bars.update((int(kline[0]), tuple(kline[1:])) for kline in klines)
+
+
+def check_day_bars():
+    problems = []
+    for day, day_ms in DAYS.items():
+        path = os.path.join(FIXTURES, ARCHIVE_NAME.format(symbol=SYMBOL, day=day))
+        for label, prev_close, fill in (('fill', None, True), ('prev_close', 59000.0, True), ('no-fill', None, False)):
+            timestamps, values = day_bars(path, day_ms, prev_close, fill)
+            ours = [(ts, *row) for ts, row in zip(timestamps.tolist(), values.tolist())]
+            problems += compare(f"{day} {label}", ours, reference_bars(path, day_ms, prev_close, fill))
+    return problems
+
+
+def check_import():
+    sink = CollectSink()
+    imported, rows = asyncio.run(import_symbol(sink, SYMBOL, set(DAYS.values()), directory=FIXTURES))
+
+    problems = []
+    if imported != 3:
+        problems.append(f"import: импортировано дней {imported}, ожидалось 3")
+    expected = []
+    prev_close = None
+    for day, day_ms in DAYS.items():
+        path = os.path.join(FIXTURES, ARCHIVE_NAME.format(symbol=SYMBOL, day=day))
+        if day_ms - DAY_MS not in DAYS.values():
+            prev_close = None  # предыдущий день не импортировался
+        day_expected = reference_bars(path, day_ms, prev_close)
+        expected += day_expected
+        prev_close = day_expected[-1][4]
+    ours = [(ts, *sink.bars[ts]) for ts in sorted(sink.bars)]
+    if rows != len(ours):
+        problems.append(f"import: записано свечей {len(ours)}, import_symbol насчитал {rows}")
+    return problems + compare("import", ours, expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка свечей archive.py с агрегацией на чистом Python")
+    parser.add_argument('--write-fixtures', action='store_true', help="пересоздать архивы в benchmarks/fixtures/archive")
+    args = parser.parse_args()
+    if args.write_fixtures:
+        write_fixtures()
+
+    problems = check_day_bars() + check_import()
+    for problem in problems:
+        print(problem)
+    print("Расхождений нет" if not problems else f"Расхождений: {len(problems)}")
+    raise SystemExit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""Локальный эмулятор публичного API ByBit для проверок без биржи.
+
+REST /v5/market/kline и /v5/market/tickers: свечи детерминированы по тикеру
+и минуте, ответ содержит последние limit свечей из [start, end] от новых к
+старым, как у биржи. Свечи interval=60 и D собираются из тех же минутных. Задержка (--latency, --jitter), лимит запросов с
+заголовками X-Bapi-Limit-* (--rate-limit запросов за 5 секунд, превышение -
+retCode 10006) и внедрение ошибок (--error-rate: HTTP 502, retCode 10016,
+битый JSON, зависание на --stall секунд).
+
+WebSocket /v5/public/spot: подписка kline.1.<symbol>, ответ на ping, поток
+незакрытых и закрытых свечей. Минута эмулятора идет с ускорением
+(--bar-interval секунд на свечу), --drop-after N рвет соединение после
+N закрытых свечей, чтобы проверить переподключение и догрузку через REST.
+
+    python benchmarks/mock_bybit.py --port 8765
+    python ByBitDownloader.py --headless --live --ws-url ws://127.0.0.1:8765/v5/public/spot
+"""
+import argparse
+import asyncio
+import collections
+import json
+import math
+import random
+import time
+import zlib
+
+from aiohttp import web, WSMsgType
+
+
+def make_bar(start_ms, price, confirm):
+    close = price * (1 + random.uniform(-0.001, 0.001))
+    volume = random.uniform(1, 100)
+    return {
+        'start': start_ms,
+        'end': start_ms + 59999,
+        'interval': '1',
+        'open': f"{price:.4f}",
+        'close': f"{close:.4f}",
+        'high': f"{max(price, close) * 1.0005:.4f}",
+        'low': f"{min(price, close) * 0.9995:.4f}",
+        'volume': f"{volume:.4f}",
+        'turnover': f"{volume * close:.4f}",
+        'confirm': confirm,
+        'timestamp': int(time.time() * 1000),
+    }, close
+
+
+RATE_WINDOW = 5  # секунды, окно лимита запросов биржи
+INTERVALS = {'1': 1, '60': 60, 'D': 1440}  # минут в свече
+ERROR_KINDS = ('http_502', 'retcode', 'garbage', 'stall')
+
+
+def rest_bar(symbol, start_ms):
+    """Детерминированная свеча в формате REST: [start, open, high, low, close, volume, turnover]"""
+    seed = zlib.crc32(symbol.encode())
+    minute = start_ms // 60000
+    price = 100 + 10 * math.sin(minute / 720 + seed) + (seed % 97)
+    close = price * (1 + 0.001 * math.sin(minute * 0.7 + seed))
+    volume = 1 + (minute * 2654435761 + seed) % 1000 / 10
+    return [
+        str(start_ms), f"{price:.4f}", f"{max(price, close) * 1.0005:.4f}",
+        f"{min(price, close) * 0.9995:.4f}", f"{close:.4f}", f"{volume:.4f}", f"{volume * close:.4f}"
+    ]
+
+
+def rest_bucket(symbol, start_ms, minutes, first_ms, last_ms):
+    """Свеча на minutes минут из минутных свечей внутри [first_ms, last_ms]"""
+    bars = [rest_bar(symbol, ts) for ts in range(max(start_ms, first_ms),
+                                                 min(start_ms + minutes * 60000, last_ms + 1), 60000)]
+    return [
+        str(start_ms), bars[0][1], f"{max(float(bar[2]) for bar in bars):.4f}",
+        f"{min(float(bar[3]) for bar in bars):.4f}", bars[-1][4],
+        f"{sum(float(bar[5]) for bar in bars):.4f}", f"{sum(float(bar[6]) for bar in bars):.4f}"
+    ]
+
+
+class MockBybit:
+    def __init__(self, bar_interval=1.0, drop_after=0, latency=0.0, jitter=0.0,
+                 rate_limit=600, error_rate=0.0, stall=30.0, tickers=50, listed_since_ms=0):
+        self.bar_interval = bar_interval
+        self.drop_after = drop_after
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.stall = stall
+        self.tickers = tickers
+        self.listed_since_ms = listed_since_ms
+        self.requests = collections.deque()
+        self.stats = collections.Counter()
+
+    def rate_headers(self):
+        now = time.time()
+        while self.requests and self.requests[0] < now - RATE_WINDOW:
+            self.requests.popleft()
+        self.requests.append(now)
+        remaining = max(self.rate_limit - len(self.requests), 0)
+        reset = int((self.requests[0] + RATE_WINDOW) * 1000)
+        headers = {
+            'X-Bapi-Limit': str(self.rate_limit),
+            'X-Bapi-Limit-Status': str(remaining),
+            'X-Bapi-Limit-Reset-Timestamp': str(reset),
+        }
+        return headers, len(self.requests) > self.rate_limit
+
+    def api_response(self, result, headers, ret_code=0, ret_msg='OK'):
+        body = {'retCode': ret_code, 'retMsg': ret_msg, 'result': result,
+                'retExtInfo': {}, 'time': int(time.time() * 1000)}
+        return web.json_response(body, headers=headers)
+
+    async def before_request(self, kind):
+        """Общая часть REST: задержка, лимит и внедрение ошибок. Возвращает ответ с ошибкой или заголовки лимита"""
+        self.stats[f"{kind}_requests"] += 1
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        headers, limited = self.rate_headers()
+        if limited:
+            self.stats['rate_limited'] += 1
+            return self.api_response({}, headers, 10006, 'Too many visits!')
+
+        if self.error_rate and random.random() < self.error_rate:
+            error = random.choice(ERROR_KINDS)
+            self.stats[f"error_{error}"] += 1
+            if error == 'http_502':
+                return web.Response(status=502, text='<html>502 Bad Gateway</html>',
+                                    content_type='text/html', headers=headers)
+            if error == 'retcode':
+                return self.api_response({}, headers, 10016, 'Server error')
+            if error == 'garbage':
+                return web.Response(text='{"retCode": 0, "result": {"list": [',
+                                    content_type='application/json', headers=headers)
+            await asyncio.sleep(self.stall)
+        return headers
+
+    async def handle_kline(self, request):
+        headers = await self.before_request('kline')
+        if isinstance(headers, web.StreamResponse):
+            return headers
+
+        query = request.query
+        symbol = query.get('symbol', '')
+        minutes = INTERVALS.get(query.get('interval', '1'))
+        if minutes is None:
+            return self.api_response({}, headers, 10001, 'Only interval=1, 60 and D are emulated')
+        step = minutes * 60000
+        limit = min(max(int(query.get('limit', 200)), 1), 1000)
+        now_ms = int(time.time() // 60) * 60000
+        end = min(int(query.get('end', now_ms)), now_ms)
+        start = int(query.get('start', end - (limit - 1) * step))
+
+        first = -(-start // step) * step
+        last = end // step * step
+        first = max(first, last - (limit - 1) * step, -(-self.listed_since_ms // step) * step)
+        if minutes == 1:
+            bars = [rest_bar(symbol, ts) for ts in range(last, first - 1, -step)]
+        else:
+            # Последняя свеча периода не закрыта: в нее входят минуты до текущей
+            bars = [rest_bucket(symbol, ts, minutes, self.listed_since_ms, now_ms)
+                    for ts in range(last, first - 1, -step)]
+        self.stats['bars'] += len(bars)
+        return self.api_response({'category': 'spot', 'symbol': symbol, 'list': bars}, headers)
+
+    async def handle_tickers(self, request):
+        headers = await self.before_request('tickers')
+        if isinstance(headers, web.StreamResponse):
+            return headers
+        tickers = [
+            {'symbol': f"MOCK{i:03d}USDT", 'lastPrice': '1.0', 'volume24h': str(1000 + i),
+             'turnover24h': str(10000 + i * 10), 'price24hPcnt': '0.01'}
+            for i in range(self.tickers)
+        ]
+        return self.api_response({'category': 'spot', 'list': tickers}, headers)
+
+    async def handle_stats(self, request):
+        return web.json_response(dict(self.stats))
+
+    async def handle_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        topics = set()
+        sender = asyncio.create_task(self.send_bars(ws, topics))
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+                op = data.get('op')
+                if op == 'ping':
+                    await ws.send_json({'success': True, 'ret_msg': 'pong', 'op': 'ping'})
+                elif op == 'subscribe':
+                    args = data.get('args', [])
+                    ok = len(args) <= 10 and all(a.startswith('kline.1.') for a in args)
+                    if ok:
+                        topics.update(args)
+                    await ws.send_json({'success': ok, 'ret_msg': '' if ok else 'bad args', 'op': 'subscribe'})
+        finally:
+            sender.cancel()
+        return ws
+
+    async def send_bars(self, ws, topics):
+        minute = int(time.time() // 60) * 60000
+        prices = {}
+        confirmed = 0
+        while not ws.closed:
+            for topic in list(topics):
+                price = prices.get(topic, 100.0)
+                # Незакрытая свеча, затем закрытая за ту же минуту
+                bar, _ = make_bar(minute, price, False)
+                await ws.send_json({'topic': topic, 'type': 'snapshot', 'ts': bar['timestamp'], 'data': [bar]})
+                bar, prices[topic] = make_bar(minute, price, True)
+                await ws.send_json({'topic': topic, 'type': 'snapshot', 'ts': bar['timestamp'], 'data': [bar]})
+            if topics:
+                confirmed += 1
+                minute += 60000
+            if self.drop_after and confirmed >= self.drop_after:
+                await ws.close()
+                return
+            await asyncio.sleep(self.bar_interval)
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_get('/v5/public/spot', self.handle_ws)
+        app.router.add_get('/v5/market/kline', self.handle_kline)
+        app.router.add_get('/v5/market/tickers', self.handle_tickers)
+        app.router.add_get('/stats', self.handle_stats)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--bar-interval', type=float, default=1.0, help="секунд на одну минутную свечу")
+    parser.add_argument('--drop-after', type=int, default=0, help="рвать соединение после N закрытых свечей")
+    parser.add_argument('--latency', type=float, default=0.0, help="задержка ответа REST, секунды")
+    parser.add_argument('--jitter', type=float, default=0.0, help="случайная добавка к задержке, секунды")
+    parser.add_argument('--rate-limit', type=int, default=600, help="запросов за 5 секунд")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов с ошибкой")
+    parser.add_argument('--stall', type=float, default=30.0, help="длительность зависания, секунды")
+    parser.add_argument('--tickers', type=int, default=50, help="размер списка тикеров")
+    args = parser.parse_args()
+
+    mock = MockBybit(bar_interval=args.bar_interval, drop_after=args.drop_after,
+                     latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                     error_rate=args.error_rate, stall=args.stall, tickers=args.tickers)
+    web.run_app(mock.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
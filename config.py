@@ -0,0 +1,57 @@
+import configparser
+import logging
+
+SETTINGS_FILE = "settings.ini"
+
+
+def _unquote(value):
+    """Снимает кавычки, которыми QSettings оборачивает строки со спецсимволами"""
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1].replace('\\"', '"').replace('\\\\', '\\')
+    return value
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Читает settings.ini (формат QSettings IniFormat) без загрузки Qt"""
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(path, encoding='utf-8')
+
+    def get(section, key, default):
+        if parser.has_option(section, key):
+            return _unquote(parser.get(section, key))
+        return default
+
+    selected = get("General", "selected_tickers", "")
+    if selected == "@Invalid()":
+        # Так QSettings сохраняет пустой список
+        selected = ""
+    settings = {
+        'host': get("postgres", "host", ""),
+        'port': get("postgres", "port", "5432"),
+        'user': get("postgres", "user", ""),
+        'password': get("postgres", "password", ""),
+        'database': get("postgres", "database", ""),
+        'schema': get("settings", "schema", "bybit_data"),
+        'sink': get("settings", "sink", "postgres") or "postgres",
+        'parquet_dir': get("settings", "parquet_dir", "data") or "data",
+        'mmap_dir': get("settings", "mmap_dir", "minutes") or "minutes",
+        'threads': int(get("settings", "threads", "5") or 5),
+        'metrics_port': int(get("settings", "metrics_port", "0") or 0),
+        'trace_dir': get("settings", "trace_dir", ""),
+        'profile': get("settings", "profile", "false").lower() == "true",
+        'selected_tickers': [s.strip() for s in selected.split(",") if s.strip()],
+    }
+
+    # Параметры запросов к бирже: если не заданы, действуют значения движка
+    for key, convert in (('request_timeout', float), ('max_retries', int), ('hedge_percentile', float)):
+        value = get("settings", key, "").replace(",", ".")
+        if not value:
+            continue
+        try:
+            settings[key] = convert(value)
+        except ValueError:
+            logging.error(f"Некорректное значение {key} в {path}: {value!r}, используется значение по умолчанию")
+    if not 0 <= settings.get('hedge_percentile', 0) <= 1:
+        logging.error(f"hedge_percentile в {path} должен быть от 0 до 1: {settings.pop('hedge_percentile')}")
+    return settings
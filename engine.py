@@ -0,0 +1,595 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from datetime import timedelta
+
+from tracing import span
+from metrics import (REQUEST_LATENCY, REQUEST_RETRIES, REQUEST_FAILURES, ROWS_WRITTEN,
+                     SAVE_LATENCY, QUEUE_DEPTH, ACTIVE_WORKERS, SYMBOL_LAG,
+                     HEDGED_REQUESTS, BREAKER_OPEN, BREAKER_TRIPS)
+from sinks import make_sink
+from timeutil import utc, utc_now, ceil_minute, ms_to_datetime, datetime_to_ms, split_by_month
+
+KLINE_URL = "https://api.bybit.com/v5/market/kline"
+KLINE_LIMIT = 1000  # свечей в одном ответе kline (максимум биржи)
+WINDOW_PAUSE = 0.1  # секунды между запросами одного периода
+RATE_LIMIT = 120  # запросов в секунду: лимит биржи 600 за 5 секунд на IP
+PLAN_LATENCY = 0.3  # секунды на запрос для оценки, пока нет своих замеров
+SYNC_LOOKBACK_MINUTES = 60  # окно пересмотра для поздних исправлений биржи
+REQUEST_TIMEOUT = 10  # секунды на одну попытку запроса
+MAX_RETRIES = 5
+RETRY_DELAY_BASE = 0.5  # секунды
+RETRY_DELAY_MAX = 15  # секунды
+BREAKER_THRESHOLD = 10  # подряд неудачных попыток по всем тикерам
+BREAKER_PAUSE = 5  # секунды, удваивается при повторных срабатываниях
+BREAKER_PAUSE_MAX = 120  # секунды
+LATENCY_WINDOW = 200  # последних успешных запросов для перцентиля хеджирования
+LATENCY_MIN_SAMPLES = 20
+
+REQUEST_HEADERS = {
+    'Accept': 'application/json',
+    'User-Agent': 'Mozilla/5.0'
+}
+
+
+def period_minutes(start_date, end_date):
+    """Число минутных свечей в периоде [start_date, end_date] включительно"""
+    start_date = ceil_minute(start_date)
+    if start_date > end_date:
+        return 0
+    return (end_date - start_date) // timedelta(minutes=1) + 1
+
+
+def request_count(start_date, end_date, limit=KLINE_LIMIT):
+    """Число запросов kline на период при окнах по limit минут"""
+    return -(-period_minutes(start_date, end_date) // limit)
+
+
+def pack_periods(periods, limit=KLINE_LIMIT):
+    """Упаковывает пропуски в окна запросов.
+
+    Пропуск, который помещается в последнее окно предыдущего периода,
+    присоединяется к нему: минуты между ними скачиваются заново (запись
+    идемпотентна), зато короткие пропуски рядом стоят один запрос, а не
+    запрос на каждый.
+    """
+    packed = []
+    for start, end in sorted(periods):
+        if packed:
+            last_start, last_end = packed[-1]
+            tail = ceil_minute(last_start) + timedelta(minutes=limit * (request_count(last_start, last_end, limit) - 1))
+            if end < tail + timedelta(minutes=limit):
+                packed[-1] = (last_start, max(last_end, end))
+                continue
+        packed.append((start, end))
+    return packed
+
+
+class LatencyTracker:
+    """Скользящее окно задержек успешных запросов"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+
+    def record(self, latency):
+        self.samples.append(latency)
+
+    def percentile(self, q):
+        if len(self.samples) < LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class CircuitBreaker:
+    """Общая пауза всех запросов при серии ошибок биржи.
+
+    После threshold неудач подряд запросы ждут pause секунд. Первая же
+    неудача после паузы снова открывает breaker с удвоенной паузой,
+    первый успех возвращает исходное состояние.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, pause=BREAKER_PAUSE, max_pause=BREAKER_PAUSE_MAX):
+        self.threshold = threshold
+        self.pause = pause
+        self.max_pause = max_pause
+        self.current_pause = pause
+        self.failures = 0
+        self.open_until = 0.0
+
+    async def wait(self):
+        delay = self.open_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_success(self):
+        self.failures = 0
+        self.current_pause = self.pause
+        # Следующее срабатывание - снова с исходной паузы, а не продолжение удвоения
+        self.open_until = 0.0
+        BREAKER_OPEN.set(0)
+
+    def record_failure(self):
+        """Учитывает неудачу. Возвращает True, если breaker только что открылся"""
+        self.failures += 1
+        now = time.monotonic()
+        if self.failures < self.threshold or now < self.open_until:
+            return False
+        if self.open_until:
+            self.current_pause = min(self.current_pause * 2, self.max_pause)
+        self.open_until = now + self.current_pause
+        self.failures = self.threshold - 1
+        BREAKER_OPEN.set(1)
+        BREAKER_TRIPS.inc()
+        return True
+
+
+class DownloadEngine:
+    """Асинхронная загрузка минутных свечей с ByBit в хранилище (sinks.py) без привязки к UI"""
+
+    def __init__(self, settings, on_status=None, on_progress=None, sink=None):
+        self.settings = settings
+        self.on_status = on_status or (lambda message: None)
+        self.on_progress = on_progress or (lambda symbol, end_date=None: None)
+
+        self.shutdown = False
+        self.sink = sink if sink is not None else make_sink(settings)
+        self.kline_url = settings.get('kline_url', KLINE_URL)
+        self.kline_limit = settings.get('kline_limit', KLINE_LIMIT)
+        self.rate_limit = settings.get('rate_limit', RATE_LIMIT)
+        self.request_timeout = settings.get('request_timeout', REQUEST_TIMEOUT)
+        self.max_retries = settings.get('max_retries', MAX_RETRIES)
+        self.hedge_percentile = settings.get('hedge_percentile', 0)
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+        self.download_threads = settings.get('threads', 5)
+        self.download_progress = {}
+        self.total_minutes = 0
+        self.completed_minutes = 0
+        self.calculated_tickers = 0
+        self.total_tickers_to_calculate = 0
+        self.active_threads = 0
+
+    def update_status(self, message):
+        self.on_status(message)
+
+    def update_calculation_progress(self):
+        """Сообщает прогресс расчета и число активных потоков"""
+        ACTIVE_WORKERS.set(self.active_threads)
+        if self.total_tickers_to_calculate > 0:
+            self.update_status(
+                f"Расчет минут: {self.calculated_tickers}/{self.total_tickers_to_calculate} тикеров | "
+                f"Активных потоков: {self.active_threads}"
+            )
+        else:
+            self.update_status(f"Активных потоков: {self.active_threads}")
+
+    def run_planner(self, start_date, end_date):
+        """(plan_symbol, prepare) для поиска пропусков за период"""
+        start_date, end_date = utc(start_date), utc(end_date)
+
+        async def plan_symbol(symbol):
+            return await self.check_missing_data(symbol, start_date, end_date)
+
+        return plan_symbol, None
+
+    def sync_planner(self, selected_tickers, default_start, lookback_minutes=SYNC_LOOKBACK_MINUTES):
+        """(plan_symbol, prepare) для синхронизации от последней сохраненной свечи.
+
+        Вместо поиска пропусков по всему периоду берет у хранилища время
+        последней свечи по всем тикерам сразу и качает от него (минус окно
+        пересмотра для поздних исправлений биржи) до текущего времени. Тикеры
+        без данных качаются с default_start.
+        """
+        default_start = utc(default_start)
+        end_date = utc_now()
+        lookback = timedelta(minutes=lookback_minutes)
+        watermarks = {}
+
+        async def prepare():
+            started = time.perf_counter()
+            watermarks.update(await self.sink.watermarks(selected_tickers))
+            logging.info(f"Водяные знаки для {len(selected_tickers)} тикеров получены за "
+                         f"{time.perf_counter() - started:.3f} с")
+
+        async def plan_symbol(symbol):
+            watermark = watermarks.get(symbol)
+            self.calculated_tickers += 1
+            self.update_calculation_progress()
+            if watermark is None:
+                return split_by_month(default_start, end_date)
+            start = max(watermark - lookback, default_start)
+            return [(start, end_date)] if start < end_date else []
+
+        return plan_symbol, prepare
+
+    async def run(self, selected_tickers, start_date, end_date):
+        """Догружает недостающие данные по тикерам. Возвращает False, если были ошибки"""
+        return await self.execute(selected_tickers, *self.run_planner(start_date, end_date))
+
+    async def sync(self, selected_tickers, default_start, lookback_minutes=SYNC_LOOKBACK_MINUTES):
+        """Доводит тикеры до текущего момента от последней сохраненной свечи"""
+        return await self.execute(selected_tickers,
+                                  *self.sync_planner(selected_tickers, default_start, lookback_minutes))
+
+    async def run_job(self, periods):
+        """Скачивает заранее спланированные периоды {тикер: [(start, end), ...]} (planner.load_job)"""
+        async def plan_symbol(symbol):
+            return periods[symbol]
+
+        return await self.execute(list(periods), plan_symbol)
+
+    async def plan(self, selected_tickers, plan_symbol, prepare=None):
+        """Только планирование, без скачивания: {тикер: [(start, end), ...]} пропусков.
+
+        plan_symbol и prepare - из run_planner или sync_planner. Тикеры, для
+        которых расчет не удался, в результат не попадают.
+        """
+        self.calculated_tickers = 0
+        self.total_tickers_to_calculate = len(selected_tickers)
+
+        await self.sink.open(self.download_threads)
+        try:
+            # План не должен менять хранилище: таблицы только проверяются
+            await self.sink.bootstrap(selected_tickers, create=False)
+            if prepare is not None:
+                await prepare()
+            results = await asyncio.gather(*(plan_symbol(symbol) for symbol in selected_tickers),
+                                           return_exceptions=True)
+        finally:
+            await self.sink.close()
+
+        periods = {}
+        for symbol, result in zip(selected_tickers, results):
+            if isinstance(result, Exception):
+                logging.error(f"Ошибка расчета для {symbol}: {str(result)}")
+                self.update_status(f"Ошибка расчета для {symbol}")
+            else:
+                periods[symbol] = result
+        return periods
+
+    async def execute(self, selected_tickers, plan_symbol, prepare=None):
+        """Планирует периоды по тикерам через plan_symbol и скачивает их в параллельных потоках"""
+        self.shutdown = False
+        self.total_minutes = 0
+        self.completed_minutes = 0
+        self.calculated_tickers = 0
+        self.total_tickers_to_calculate = len(selected_tickers)
+        self.active_threads = 0
+
+        await self.sink.open(self.download_threads)
+        try:
+            # Каталог и таблицы всех тикеров готовятся один раз до расчета и загрузки
+            with span('bootstrap', symbols=len(selected_tickers)):
+                await self.sink.bootstrap(selected_tickers)
+            if prepare is not None:
+                await prepare()
+
+            semaphore = asyncio.Semaphore(self.download_threads)
+            download_tasks = []
+            calculation_tasks = []
+            ticker_queue = asyncio.Queue()
+
+            async def calculate_missing_periods(symbol):
+                """Асинхронно рассчитывает недостающие периоды для символа"""
+                try:
+                    with span('plan', symbol=symbol):
+                        missing_periods = pack_periods(await plan_symbol(symbol), self.kline_limit)
+
+                    if missing_periods:
+                        total_minutes = sum(
+                            period_minutes(start, end)
+                            for start, end in missing_periods
+                        )
+
+                        self.download_progress[symbol] = {
+                            'progress': 0,
+                            'total': int(total_minutes),
+                            'completed': 0
+                        }
+
+                        # Добавляем в очередь для загрузки
+                        await ticker_queue.put((symbol, missing_periods))
+                        QUEUE_DEPTH.set(ticker_queue.qsize())
+                        self.total_minutes += int(total_minutes)
+                    else:
+                        self.download_progress[symbol] = {
+                            'progress': 100,
+                            'total': 0,
+                            'completed': 0
+                        }
+
+                except Exception as e:
+                    logging.error(f"Ошибка расчета для {symbol}: {str(e)}")
+                    self.update_status(f"Ошибка расчета для {symbol}")
+
+            async def download_worker():
+                """Рабочий процесс для загрузки данных"""
+                while not self.shutdown:
+                    try:
+                        symbol, periods = await asyncio.wait_for(
+                            ticker_queue.get(),
+                            timeout=1.0
+                        )
+                        QUEUE_DEPTH.set(ticker_queue.qsize())
+
+                        for period_start, period_end in periods:
+                            if self.shutdown:
+                                break
+
+                            task = asyncio.create_task(
+                                self.download_symbol_data(
+                                    symbol,
+                                    period_start, period_end,
+                                    semaphore
+                                )
+                            )
+                            download_tasks.append(task)
+
+                        ticker_queue.task_done()
+                    except asyncio.TimeoutError:
+                        # Проверяем, все ли задачи расчета завершены
+                        if all(t.done() for t in calculation_tasks):
+                            break
+
+            # Запускаем рабочие процессы для загрузки (по числу потоков)
+            download_workers = [
+                asyncio.create_task(download_worker())
+                for _ in range(self.download_threads)
+            ]
+
+            # Запускаем расчет для всех тикеров
+            for symbol in selected_tickers:
+                calculation_tasks.append(asyncio.create_task(
+                    calculate_missing_periods(symbol))
+                )
+
+            # Ждем завершения всех задач расчета
+            await asyncio.gather(*calculation_tasks)
+
+            # Даем время рабочим процессам завершить загрузку
+            await asyncio.wait_for(
+                asyncio.gather(*download_workers),
+                timeout=10.0
+            )
+
+            # Ждем завершения оставшихся задач загрузки
+            if download_tasks and not self.shutdown:
+                results = await asyncio.gather(*download_tasks, return_exceptions=True)
+                return not any(result is False or isinstance(result, Exception) for result in results)
+            return True
+        finally:
+            await self.sink.close()
+
+    async def check_missing_data(self, symbol, start_date, end_date):
+        self.update_status(f"Проверка данных для {symbol}")
+        try:
+            missing_periods = await self.sink.missing_periods(symbol, start_date, end_date)
+            self.calculated_tickers += 1
+            self.update_calculation_progress()
+            return missing_periods
+        except Exception as e:
+            self.update_status(f"Ошибка при проверке данных для {symbol}: {str(e)}")
+            raise
+
+    async def download_symbol_data(self, symbol, start_date, end_date, semaphore=None):
+        """Скачивает период. Возвращает False, если биржа так и не отдала данные"""
+        if self.shutdown:
+            return False
+
+        self.active_threads += 1
+        self.update_calculation_progress()
+
+        try:
+            async with semaphore:
+                total_minutes = period_minutes(start_date, end_date)
+                processed_minutes = 0
+
+                # Таблица уже создана в bootstrap, здесь - проверка по реестру без запроса к базе
+                await self.sink.ensure_table(symbol)
+
+                async with self.client_session() as session:
+                    current_start = ceil_minute(start_date)
+
+                    while current_start <= end_date and not self.shutdown:
+                        # Окно - ровно kline_limit минут включительно, поэтому ответ
+                        # биржи (последние limit свечей окна) покрывает его целиком
+                        current_end = min(current_start + timedelta(minutes=self.kline_limit - 1), end_date)
+
+                        # Получаем данные
+                        klines = await self.fetch_klines(session, symbol, start_time=current_start, end_time=current_end)
+
+                        if klines is None:
+                            # Период останется пропуском и будет найден при следующем запуске
+                            return False
+
+                        if klines:
+                            # Сохраняем данные в хранилище
+                            await self.save_klines(symbol, klines)
+
+                        # Обновляем прогресс после успешной вставки
+                        minutes_processed = period_minutes(current_start, current_end)
+                        processed_minutes += minutes_processed
+                        self.completed_minutes += minutes_processed
+                        current_start = current_end + timedelta(minutes=1)
+
+                        # Обновляем UI
+                        progress = int((processed_minutes / total_minutes) * 100)
+                        self.download_progress[symbol] = {
+                            'progress': min(progress, 100),
+                            'completed': processed_minutes,
+                            'total': total_minutes
+                        }
+                        self.on_progress(symbol, current_start)
+
+                        # Небольшая пауза чтобы не перегружать систему
+                        await asyncio.sleep(WINDOW_PAUSE)
+
+                    if not self.shutdown:
+                        self.download_progress[symbol] = {
+                            'progress': 100,
+                            'completed': processed_minutes,
+                            'total': total_minutes
+                        }
+                        self.on_progress(symbol, end_date)
+                    return True
+        except Exception as e:
+            error_msg = f"Ошибка при загрузке {symbol}: {str(e)}"
+            logging.error(error_msg)
+            self.update_status(error_msg)
+            return False
+        finally:
+            self.active_threads -= 1
+            self.update_calculation_progress()
+
+    def client_session(self):
+        """HTTP сессия с дедлайном на каждую попытку запроса"""
+        import aiohttp
+
+        return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.request_timeout))
+
+    def backoff_delay(self, attempt):
+        """Экспоненциальная пауза с полным джиттером"""
+        return random.uniform(0, min(RETRY_DELAY_MAX, RETRY_DELAY_BASE * 2 ** attempt))
+
+    async def fetch_klines(self, session, symbol, start_time=None, end_time=None, interval='1'):
+        """Запрашивает данные с биржи с повторными попытками при ошибках.
+
+        Каждая попытка ограничена request_timeout, паузы между попытками растут
+        экспоненциально со случайной добавкой. При серии ошибок по всем
+        тикерам срабатывает circuit breaker и приостанавливает все запросы.
+        """
+        params = {
+            'category': 'spot',
+            'symbol': symbol,
+            'interval': interval,
+            'limit': self.kline_limit
+        }
+
+        if start_time:
+            params['start'] = datetime_to_ms(start_time)
+        if end_time:
+            params['end'] = datetime_to_ms(end_time)
+
+        last_error = None
+        for attempt in range(self.max_retries):
+            await self.breaker.wait()
+            if self.shutdown:
+                return None
+
+            klines, last_error = await self.hedged_request(session, symbol, params, attempt)
+            if klines is not None:
+                self.breaker.record_success()
+                return klines
+
+            if self.breaker.record_failure():
+                message = f"Серия ошибок биржи, запросы приостановлены на {self.breaker.current_pause:.0f} с"
+                logging.warning(message)
+                self.update_status(message)
+            if attempt < self.max_retries - 1:
+                await asyncio.sleep(self.backoff_delay(attempt))
+
+        # Все попытки неудачны
+        REQUEST_FAILURES.inc()
+        error_msg = f"Не удалось получить данные для {symbol} после {self.max_retries} попыток. Последняя ошибка: {last_error}"
+        logging.error(error_msg)
+        self.update_status(error_msg)
+        return None
+
+    async def hedged_request(self, session, symbol, params, attempt):
+        """Попытка запроса. Если ответа нет дольше перцентиля задержек, отправляется дубль"""
+        first = asyncio.create_task(self.request_once(session, symbol, params, attempt))
+        hedge_delay = self.latency.percentile(self.hedge_percentile) if self.hedge_percentile else None
+        if hedge_delay is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+        if done:
+            return first.result()
+
+        HEDGED_REQUESTS.inc()
+        pending = {first, asyncio.create_task(self.request_once(session, symbol, params, attempt))}
+        result = None, None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result[0] is not None:
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def request_once(self, session, symbol, params, attempt):
+        """Один запрос kline. Возвращает (список свечей или None, текст ошибки)"""
+        started = time.perf_counter()
+
+        def failed(cause, error):
+            REQUEST_RETRIES.labels(cause).inc()
+            REQUEST_LATENCY.labels('error').observe(time.perf_counter() - started)
+            logging.error(f"Attempt {attempt + 1} failed for {symbol}: {error}")
+            return None, error
+
+        try:
+            with span('http', symbol=symbol, attempt=attempt + 1):
+                async with session.get(self.kline_url, params=params, headers=REQUEST_HEADERS) as response:
+                    # Проверка статуса ответа
+                    if response.status != 200:
+                        error_text = await response.text()
+                        return failed(f"http_{response.status}", f"HTTP {response.status}: {error_text}")
+
+                    # Проверка формата данных
+                    content_type = response.headers.get('Content-Type', '')
+                    if 'application/json' not in content_type:
+                        error_text = await response.text()
+                        return failed('content_type', f"Invalid content type: {content_type}, response: {error_text}")
+
+                    # Парсинг JSON
+                    try:
+                        with span('parse_json'):
+                            data = await response.json()
+                    except asyncio.TimeoutError:
+                        raise
+                    except Exception as e:
+                        return failed('json', f"JSON parse error: {str(e)}")
+
+            # Проверка структуры ответа
+            if not isinstance(data, dict):
+                return failed('format', "Response is not a dictionary")
+
+            # Проверка кода ошибки
+            if data.get('retCode') != 0:
+                ret_msg = data.get('retMsg', 'Unknown error')
+                return failed('api', f"API error: {ret_msg}")
+
+            # Проверка наличия данных
+            if not isinstance(data.get('result', {}).get('list'), list):
+                return failed('format', "Invalid data format in response")
+
+            # Успешный запрос
+            latency = time.perf_counter() - started
+            REQUEST_LATENCY.labels('ok').observe(latency)
+            self.latency.record(latency)
+            return data['result']['list'], None
+
+        except asyncio.TimeoutError:
+            return failed('timeout', f"Request timed out after {self.request_timeout} s")
+        except Exception as e:
+            return failed('connection', f"Request failed: {str(e)}")
+
+    async def save_klines(self, symbol, klines):
+        """Записывает свечи в хранилище. False, если ничего не записано (остановка)"""
+        if self.shutdown or not klines:
+            return False
+
+        with SAVE_LATENCY.time(), span('save_klines', symbol=symbol, rows=len(klines)):
+            await self.sink.write(symbol, klines)
+
+        ROWS_WRITTEN.inc(len(klines))
+        newest = ms_to_datetime(max(int(kline[0]) for kline in klines))
+        SYMBOL_LAG.labels(symbol).set((utc_now() - newest).total_seconds())
+        return True
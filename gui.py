@@ -0,0 +1,709 @@
+import sys
+import asyncio
+import logging
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
+                             QLabel, QDateTimeEdit, QPushButton, QLineEdit, QTableWidget,
+                             QDialog, QFormLayout, QMessageBox, QTableWidgetItem, QHeaderView,
+                             QStyledItemDelegate, QStyleOptionProgressBar, QStyle, QProgressBar,
+                             QStatusBar, QCheckBox, QComboBox)
+from PyQt5.QtCore import Qt, QSettings, pyqtSignal, QDateTime, QDate, QTime
+from PyQt5.QtGui import QKeyEvent, QIntValidator, QDoubleValidator
+from qasync import QEventLoop, asyncSlot
+
+from config import SETTINGS_FILE, load_settings
+from engine import DownloadEngine
+from sinks import make_sink
+from tracing import span, record_run
+from tickers import load_cached_tickers, save_cached_tickers, fetch_tickers
+from timeutil import utc
+
+class ProgressBarDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        progress_data = index.data(Qt.DisplayRole)
+        end_date = index.data(Qt.UserRole)
+        
+        if progress_data is not None and isinstance(progress_data, dict):
+            progress = progress_data.get('progress', 0)
+            completed = progress_data.get('completed', 0)
+            total = progress_data.get('total', 1)
+            
+            opt = QStyleOptionProgressBar()
+            opt.rect = option.rect
+            opt.minimum = 0
+            opt.maximum = 100
+            opt.progress = progress
+            opt.textVisible = False
+            QApplication.style().drawControl(QStyle.CE_ProgressBar, opt, painter)
+            
+            painter.save()
+            text = f"{progress}% {completed:,}/{total:,} min"
+            
+            font = painter.font()
+            font.setPointSize(8)
+            painter.setFont(font)
+            painter.setPen(Qt.black)
+            text_rect = option.rect.adjusted(2, 2, -2, -2)
+            flags = Qt.AlignCenter | Qt.TextWordWrap
+            painter.drawText(text_rect, flags, text)
+            painter.restore()
+        else:
+            super().paint(painter, option, index)
+
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        size.setHeight(size.height() * 2)
+        return size
+
+class NumericTableWidgetItem(QTableWidgetItem):
+    def __lt__(self, other):
+        try:
+            return float(self.text().replace(" ", "")) < float(other.text().replace(" ", ""))
+        except ValueError:
+            return super().__lt__(other)
+
+class SortableTableWidget(QTableWidget):
+    headerClicked = pyqtSignal(int)
+    shiftSelectionRequested = pyqtSignal(int, int)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.horizontalHeader().sectionClicked.connect(self.headerClicked.emit)
+        self.setSortingEnabled(True)
+        self.sort_order = {}
+        self.last_selected_row = -1
+        self.setSelectionMode(QTableWidget.MultiSelection)
+        self.setSelectionBehavior(QTableWidget.SelectRows)
+
+    def mousePressEvent(self, event):
+        if event.modifiers() & Qt.ShiftModifier:
+            row = self.rowAt(event.y())
+            if row >= 0 and self.last_selected_row >= 0:
+                from_row = min(row, self.last_selected_row)
+                to_row = max(row, self.last_selected_row)
+                self.shiftSelectionRequested.emit(from_row, to_row)
+                return
+        else:
+            row = self.rowAt(event.y())
+            if row >= 0:
+                self.last_selected_row = row
+        
+        super().mousePressEvent(event)
+
+class SettingsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Настройки")
+        self.setModal(True)
+        
+        layout = QFormLayout()
+        
+        self.host_edit = QLineEdit()
+        self.port_edit = QLineEdit()
+        self.user_edit = QLineEdit()
+        self.password_edit = QLineEdit()
+        self.password_edit.setEchoMode(QLineEdit.Password)
+        self.database_edit = QLineEdit()
+        self.schema_edit = QLineEdit()
+        self.sink_combo = QComboBox()
+        self.sink_combo.addItem("PostgreSQL", "postgres")
+        self.sink_combo.addItem("Parquet файлы", "parquet")
+        self.sink_combo.addItem("Memory-mapped файлы", "mmap")
+        self.sink_combo.addItem("PostgreSQL + memory-mapped файлы", "postgres,mmap")
+        self.parquet_dir_edit = QLineEdit()
+        self.mmap_dir_edit = QLineEdit()
+        self.threads_edit = QLineEdit()
+        self.threads_edit.setValidator(QIntValidator(1, 100, self))
+        self.request_timeout_edit = QLineEdit()
+        self.request_timeout_edit.setValidator(QIntValidator(1, 300, self))
+        self.hedge_percentile_edit = QLineEdit()
+        self.hedge_percentile_edit.setPlaceholderText("например 0.95, пусто - выключено")
+        self.hedge_percentile_edit.setValidator(QDoubleValidator(0, 1, 3, self))
+        self.metrics_port_edit = QLineEdit()
+        self.metrics_port_edit.setValidator(QIntValidator(0, 65535, self))
+        self.trace_dir_edit = QLineEdit()
+        self.trace_dir_edit.setPlaceholderText("пусто - трассировка выключена")
+        self.profile_check = QCheckBox("Профилировать прогоны (cProfile)")
+        
+        layout.addRow("PostgreSQL Хост:", self.host_edit)
+        layout.addRow("PostgreSQL Порт:", self.port_edit)
+        layout.addRow("PostgreSQL Пользователь:", self.user_edit)
+        layout.addRow("PostgreSQL Пароль:", self.password_edit)
+        layout.addRow("PostgreSQL База данных:", self.database_edit)
+        layout.addRow("Схема для данных:", self.schema_edit)
+        layout.addRow("Хранилище свечей:", self.sink_combo)
+        layout.addRow("Папка Parquet файлов:", self.parquet_dir_edit)
+        layout.addRow("Папка memory-mapped файлов:", self.mmap_dir_edit)
+        layout.addRow("Число потоков скачивания:", self.threads_edit)
+        layout.addRow("Таймаут запроса к бирже, с:", self.request_timeout_edit)
+        layout.addRow("Дублировать медленные запросы (перцентиль):", self.hedge_percentile_edit)
+        layout.addRow("Порт метрик /metrics (0 - выкл):", self.metrics_port_edit)
+        layout.addRow("Папка трассировки:", self.trace_dir_edit)
+        layout.addRow("", self.profile_check)
+        
+        buttons = QHBoxLayout()
+        save_btn = QPushButton("Сохранить")
+        save_btn.clicked.connect(self.save_settings)
+        buttons.addWidget(save_btn)
+        
+        cancel_btn = QPushButton("Отмена")
+        cancel_btn.clicked.connect(self.reject)
+        buttons.addWidget(cancel_btn)
+        
+        layout.addRow(buttons)
+        self.setLayout(layout)
+        
+        self.load_settings()
+    
+    def load_settings(self):
+        settings = QSettings(SETTINGS_FILE, QSettings.IniFormat)
+        self.host_edit.setText(settings.value("postgres/host", ""))
+        self.port_edit.setText(settings.value("postgres/port", "5432"))
+        self.user_edit.setText(settings.value("postgres/user", ""))
+        self.password_edit.setText(settings.value("postgres/password", ""))
+        self.database_edit.setText(settings.value("postgres/database", ""))
+        self.schema_edit.setText(settings.value("settings/schema", "bybit_data"))
+        self.sink_combo.setCurrentIndex(max(self.sink_combo.findData(settings.value("settings/sink", "postgres")), 0))
+        self.parquet_dir_edit.setText(settings.value("settings/parquet_dir", "data"))
+        self.mmap_dir_edit.setText(settings.value("settings/mmap_dir", "minutes"))
+        self.threads_edit.setText(settings.value("settings/threads", "5"))
+        self.request_timeout_edit.setText(settings.value("settings/request_timeout", "10"))
+        self.hedge_percentile_edit.setText(settings.value("settings/hedge_percentile", ""))
+        self.metrics_port_edit.setText(settings.value("settings/metrics_port", "0"))
+        self.trace_dir_edit.setText(settings.value("settings/trace_dir", ""))
+        self.profile_check.setChecked(str(settings.value("settings/profile", "false")).lower() == "true")
+    
+    def save_settings(self):
+        settings = QSettings(SETTINGS_FILE, QSettings.IniFormat)
+        settings.setValue("postgres/host", self.host_edit.text())
+        settings.setValue("postgres/port", self.port_edit.text())
+        settings.setValue("postgres/user", self.user_edit.text())
+        settings.setValue("postgres/password", self.password_edit.text())
+        settings.setValue("postgres/database", self.database_edit.text())
+        settings.setValue("settings/schema", self.schema_edit.text())
+        settings.setValue("settings/sink", self.sink_combo.currentData())
+        settings.setValue("settings/parquet_dir", self.parquet_dir_edit.text())
+        settings.setValue("settings/mmap_dir", self.mmap_dir_edit.text())
+        settings.setValue("settings/threads", self.threads_edit.text())
+        settings.setValue("settings/request_timeout", self.request_timeout_edit.text())
+        # Валидатор принимает десятичную запятую системной локали
+        settings.setValue("settings/hedge_percentile", self.hedge_percentile_edit.text().replace(",", "."))
+        settings.setValue("settings/metrics_port", self.metrics_port_edit.text())
+        settings.setValue("settings/trace_dir", self.trace_dir_edit.text())
+        settings.setValue("settings/profile", "true" if self.profile_check.isChecked() else "false")
+        settings.sync()
+        self.accept()
+
+class MainWindow(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Загрузчик данных ByBit")
+        self.setGeometry(100, 100, 1000, 600)
+        
+        self.settings = QSettings(SETTINGS_FILE, QSettings.IniFormat)
+        self.tickers = []
+        self.selected_tickers = set()
+        self.all_tickers_data = []
+        self.current_sort_column = 3
+        self.current_sort_order = Qt.DescendingOrder
+        settings = load_settings()
+        self.metrics_runner = None
+        self.engine = DownloadEngine(
+            settings,
+            on_status=self.update_status_bar,
+            on_progress=self.update_progress_ui
+        )
+       
+        self.init_ui()
+        self.load_selected_tickers()
+        if not self.load_cached_tickers():
+            # Кэш устарел или отсутствует - обновляем в фоне, окно уже на экране
+            self.refresh_tickers()
+        if settings['metrics_port']:
+            asyncio.ensure_future(self.start_metrics(settings['metrics_port']))
+    
+    async def start_metrics(self, port):
+        from metrics import start_http_server
+        try:
+            self.metrics_runner = await start_http_server(port)
+        except Exception as e:
+            logging.error(f"Не удалось запустить экспортер метрик: {str(e)}")
+    
+    def update_status_bar(self, message):
+        """Обновление строки состояния"""
+        self.status_bar.showMessage(message)
+
+    def update_progress_ui(self, symbol, end_date=None):
+        """Обновляет только связанные с тикером элементы UI"""
+        with span('ui_update', symbol=symbol):
+            self._update_progress_ui(symbol, end_date)
+    
+    def _update_progress_ui(self, symbol, end_date=None):
+        # Обновляем прогресс-бар для конкретного тикера
+        for row in range(self.tickers_table.rowCount()):
+            if self.tickers_table.item(row, 0).text() == symbol:
+                progress_item = self.tickers_table.item(row, 4)
+                if progress_item:
+                    progress_item.setData(Qt.DisplayRole, self.engine.download_progress[symbol])
+                    if end_date:
+                        progress_item.setData(Qt.UserRole, end_date)
+                break
+        
+        # Обновляем общий прогресс
+        engine = self.engine
+        if engine.total_minutes > 0:
+            progress = int((engine.completed_minutes / engine.total_minutes) * 100)
+            self.global_progress.setValue(progress)
+            self.global_progress.setFormat(f"{progress}% ({engine.completed_minutes:,}/{engine.total_minutes:,} минут)")
+        
+        # Принудительное обновление виджета
+        self.tickers_table.viewport().update()
+    
+    def init_ui(self):
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout()
+        
+        # Период загрузки
+        period_container = QWidget()
+        period_container_layout = QHBoxLayout()
+        period_container_layout.setAlignment(Qt.AlignCenter)  # Центрирование по горизонтали
+    
+        period_layout = QHBoxLayout()
+        # Период задается в UTC, как время свечей биржи
+        period_layout.addWidget(QLabel("С (UTC):"))
+        self.from_datetime = QDateTimeEdit()
+        self.from_datetime.setTimeSpec(Qt.UTC)
+        self.from_datetime.setDateTime(QDateTime(QDate(2021, 8, 1), QTime(0, 0), Qt.UTC))
+        self.from_datetime.setDisplayFormat("yyyy-MM-dd HH:mm")
+        period_layout.addWidget(self.from_datetime)
+        
+        period_layout.addWidget(QLabel("По (UTC):"))
+        self.to_datetime = QDateTimeEdit()
+        self.to_datetime.setTimeSpec(Qt.UTC)
+        self.to_datetime.setDateTime(QDateTime.currentDateTimeUtc())
+        self.to_datetime.setDisplayFormat("yyyy-MM-dd HH:mm")
+        period_layout.addWidget(self.to_datetime)
+        
+        period_container_layout.addLayout(period_layout)
+        period_container.setLayout(period_container_layout)
+        layout.addWidget(period_container)
+        
+        # Фильтр тикеров
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Фильтр тикеров:"))
+        
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Введите часть тикера для фильтрации")
+        filter_layout.addWidget(self.filter_edit)
+        
+        self.filter_btn = QPushButton("Фильтр")
+        self.filter_btn.clicked.connect(self.apply_filter)
+        filter_layout.addWidget(self.filter_btn)
+        
+        layout.addLayout(filter_layout)
+        
+        # Таблица тикеров
+        tickers_layout = QHBoxLayout()
+        
+        left_side = QVBoxLayout()
+        left_side.addWidget(QLabel("Тикеры:"))
+        
+        self.tickers_table = SortableTableWidget()
+        self.tickers_table.setColumnCount(5)
+        self.tickers_table.setHorizontalHeaderLabels(["Тикер", "Объем", "Изменение (%)", "Оборот (24h)", "Прогресс"])
+        self.tickers_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tickers_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.tickers_table.headerClicked.connect(self.on_header_clicked)
+        self.tickers_table.shiftSelectionRequested.connect(self.handle_shift_selection)
+        self.tickers_table.setItemDelegateForColumn(4, ProgressBarDelegate())
+        left_side.addWidget(self.tickers_table)
+        
+        buttons_layout = QHBoxLayout()
+        self.refresh_btn = QPushButton("Обновить")
+        self.refresh_btn.clicked.connect(lambda: self.refresh_tickers())
+        buttons_layout.addWidget(self.refresh_btn)
+        
+        self.save_tickers_btn = QPushButton("Сохранить тикеры")
+        self.save_tickers_btn.clicked.connect(self.save_selected_tickers)
+        buttons_layout.addWidget(self.save_tickers_btn)
+        
+        self.filter_selected_btn = QPushButton("Только выделенное")
+        self.filter_selected_btn.clicked.connect(self.filter_selected_rows)
+        buttons_layout.addWidget(self.filter_selected_btn)
+        
+        left_side.addLayout(buttons_layout)
+        tickers_layout.addLayout(left_side)
+        
+        # Кнопки управления выбором
+        right_side = QVBoxLayout()
+        right_side.addStretch()
+        
+        self.select_all_btn = QPushButton("Пометить все")
+        self.select_all_btn.clicked.connect(self.select_all)
+        right_side.addWidget(self.select_all_btn)
+        
+        self.deselect_all_btn = QPushButton("Снять все")
+        self.deselect_all_btn.clicked.connect(self.deselect_all)
+        right_side.addWidget(self.deselect_all_btn)
+        
+        self.invert_selection_btn = QPushButton("Инверсия")
+        self.invert_selection_btn.clicked.connect(self.invert_selection)
+        right_side.addWidget(self.invert_selection_btn)
+        
+        right_side.addStretch()
+        tickers_layout.addLayout(right_side)
+        
+        layout.addLayout(tickers_layout)
+        
+        # Общий прогресс бар
+        self.global_progress = QProgressBar()
+        self.global_progress.setRange(0, 100)
+        self.global_progress.setTextVisible(True)
+        layout.addWidget(self.global_progress)
+        
+        # Основные кнопки
+        buttons_layout = QHBoxLayout()
+        self.load_btn = QPushButton("Загрузить")
+        self.load_btn.clicked.connect(lambda: asyncio.create_task(self.start_loading()))
+        buttons_layout.addWidget(self.load_btn)
+        
+        self.sync_btn = QPushButton("Синхронизировать")
+        self.sync_btn.setToolTip("Догрузить выделенные тикеры от последней сохраненной свечи до текущего момента")
+        self.sync_btn.clicked.connect(lambda: asyncio.create_task(self.start_loading(sync=True)))
+        buttons_layout.addWidget(self.sync_btn)
+        
+        self.plan_btn = QPushButton("Оценить")
+        self.plan_btn.setToolTip("Посчитать пропуски, число запросов, время и объем загрузки без скачивания")
+        self.plan_btn.clicked.connect(lambda: asyncio.create_task(self.estimate_loading()))
+        buttons_layout.addWidget(self.plan_btn)
+        
+        self.stop_btn = QPushButton("Остановить")
+        self.stop_btn.clicked.connect(self.stop_loading)
+        self.stop_btn.setEnabled(False)
+        buttons_layout.addWidget(self.stop_btn)
+        
+        self.settings_btn = QPushButton("Настройка")
+        self.settings_btn.clicked.connect(self.open_settings)
+        buttons_layout.addWidget(self.settings_btn)
+        
+        self.close_btn = QPushButton("Закрыть")
+        self.close_btn.clicked.connect(self.close)
+        buttons_layout.addWidget(self.close_btn)
+        
+        layout.addLayout(buttons_layout)
+        
+        # Строка состояния
+        self.status_bar = QStatusBar()
+        self.setStatusBar(self.status_bar)
+        self.update_status_bar("Готово")
+        
+        central_widget.setLayout(layout)
+    
+    def closeEvent(self, event):
+        self.engine.shutdown = True
+        
+        try:
+            loop = asyncio.get_event_loop()
+            if loop.is_running():
+                loop.create_task(self.engine.sink.close())
+        except:
+            pass
+        
+        super().closeEvent(event)
+    
+    def stop_loading(self):
+        self.engine.shutdown = True
+        self.stop_btn.setEnabled(False)
+        self.load_btn.setEnabled(True)
+        self.sync_btn.setEnabled(True)
+        
+        for task in asyncio.all_tasks():
+            if not task.done():
+                task.cancel()
+        
+        self.update_status_bar("Загрузка остановлена")
+        QMessageBox.information(self, "Остановлено", "Загрузка данных была остановлена")
+    
+    def handle_shift_selection(self, from_row, to_row):
+        self.tickers_table.clearSelection()
+        for row in range(from_row, to_row + 1):
+            for col in range(self.tickers_table.columnCount()):
+                item = self.tickers_table.item(row, col)
+                if item:
+                    item.setSelected(True)
+    
+    def on_header_clicked(self, logical_index):
+        if logical_index == self.current_sort_column:
+            self.current_sort_order = (
+                Qt.AscendingOrder if self.current_sort_order == Qt.DescendingOrder 
+                else Qt.DescendingOrder
+            )
+        else:
+            self.current_sort_column = logical_index
+            self.current_sort_order = Qt.DescendingOrder
+        
+        self.display_tickers(self.all_tickers_data)
+    
+    def select_all(self):
+        self.tickers_table.selectAll()
+    
+    def deselect_all(self):
+        self.tickers_table.clearSelection()
+    
+    def invert_selection(self):
+        for row in range(self.tickers_table.rowCount()):
+            if self.tickers_table.item(row, 0).isSelected():
+                self.tickers_table.item(row, 0).setSelected(False)
+            else:
+                self.tickers_table.item(row, 0).setSelected(True)
+    
+    def apply_filter(self):
+        filter_text = self.filter_edit.text().strip().upper()
+        
+        if not filter_text:
+            self.display_tickers(self.all_tickers_data)
+            return
+        
+        filtered_tickers = [
+            ticker for ticker in self.all_tickers_data 
+            if filter_text in ticker['symbol']
+        ]
+        self.display_tickers(filtered_tickers)
+    
+    def filter_selected_rows(self):
+        selected_rows = set()
+        
+        for row in range(self.tickers_table.rowCount()):
+            if any(self.tickers_table.item(row, col).isSelected() for col in range(self.tickers_table.columnCount())):
+                selected_rows.add(row)
+        
+        if not selected_rows:
+            QMessageBox.information(self, "Информация", "Нет выделенных строк")
+            return
+        
+        filtered_data = []
+        for row in selected_rows:
+            symbol = self.tickers_table.item(row, 0).text()
+            original_data = next((t for t in self.all_tickers_data if t['symbol'] == symbol), None)
+            if original_data:
+                filtered_data.append(original_data)
+        
+        self.display_tickers(filtered_data)
+        
+        QMessageBox.information(self, "Фильтр", f"Оставлено {len(filtered_data)} выделенных тикеров")
+    
+    def display_tickers(self, tickers_data):
+        self.tickers_table.setRowCount(len(tickers_data))
+        
+        for row, ticker in enumerate(tickers_data):
+            symbol = ticker['symbol']
+            volume = ticker['volume24h']
+            change = ticker['price24hPcnt']
+            turnover = ticker.get('turnover24h', '0')
+            
+            self.tickers_table.setItem(row, 0, QTableWidgetItem(symbol))
+            
+            try:
+                volume_rounded = int(round(float(volume)))
+                volume_formatted = "{:,}".format(volume_rounded).replace(",", " ")
+            except (ValueError, TypeError):
+                volume_formatted = volume
+                
+            volume_item = NumericTableWidgetItem(volume_formatted)
+            volume_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.tickers_table.setItem(row, 1, volume_item)
+            
+            change_item = QTableWidgetItem(f"{float(change)*100:.2f}%")
+            change_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.tickers_table.setItem(row, 2, change_item)
+            
+            try:
+                turnover_rounded = int(round(float(turnover)))
+                turnover_formatted = "{:,}".format(turnover_rounded).replace(",", " ")
+            except (ValueError, TypeError):
+                turnover_formatted = turnover
+                
+            turnover_item = NumericTableWidgetItem(turnover_formatted)
+            turnover_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.tickers_table.setItem(row, 3, turnover_item)
+            
+            progress_item = QTableWidgetItem()
+            progress_data = self.engine.download_progress.get(symbol, {'progress': 0, 'completed': 0, 'total': 1})
+            progress_item.setData(Qt.DisplayRole, progress_data)
+            self.tickers_table.setItem(row, 4, progress_item)
+
+            if symbol in self.selected_tickers:
+                for col in range(5):
+                    item = self.tickers_table.item(row, col)
+                    if item:
+                        item.setSelected(True)
+        
+        self.tickers_table.sortItems(self.current_sort_column, self.current_sort_order)
+    
+    def load_selected_tickers(self):
+        selected = self.settings.value("selected_tickers", [])
+        if isinstance(selected, str):
+            selected = [selected] if selected else []
+        self.selected_tickers = set(selected)
+    
+    def save_selected_tickers(self):
+        selected = []
+        for row in range(self.tickers_table.rowCount()):
+            if self.tickers_table.item(row, 0).isSelected():
+                selected.append(self.tickers_table.item(row, 0).text())
+        self.selected_tickers = set(selected)
+        self.settings.setValue("selected_tickers", selected)
+        self.update_status_bar(f"Сохранено {len(selected)} тикеров")
+        QMessageBox.information(self, "Сохранено", "Выбранные тикеры сохранены")
+    
+    def open_settings(self):
+        dialog = SettingsDialog(self)
+        dialog.exec_()
+    
+    def load_cached_tickers(self):
+        """Показывает тикеры из локального кэша. Возвращает True, если кэш свежий"""
+        tickers, fresh = load_cached_tickers()
+        if tickers:
+            self.all_tickers_data = tickers
+            self.display_tickers(self.all_tickers_data)
+        return fresh
+    
+    @asyncSlot()
+    async def refresh_tickers(self):
+        try:
+            self.refresh_btn.setEnabled(False)
+            if self.all_tickers_data:
+                self.update_status_bar("Обновление тикеров...")
+            else:
+                self.tickers_table.clear()
+                self.tickers_table.setRowCount(1)
+                self.tickers_table.setItem(0, 0, QTableWidgetItem("Загрузка тикеров..."))
+            
+            self.all_tickers_data = await fetch_tickers()
+            save_cached_tickers(self.all_tickers_data)
+            self.display_tickers(self.all_tickers_data)
+            self.update_status_bar("Готово")
+                    
+        except Exception as e:
+            logging.error(f"Ошибка при обновлении тикеров: {str(e)}")
+            self.update_status_bar(f"Ошибка: {str(e)}")
+        finally:
+            self.refresh_btn.setEnabled(True)
+    
+    async def start_loading(self, sync=False):
+        selected_tickers = []
+        for row in range(self.tickers_table.rowCount()):
+            if self.tickers_table.item(row, 0).isSelected():
+                selected_tickers.append(self.tickers_table.item(row, 0).text())
+        
+        if not selected_tickers:
+            self.update_status_bar("Не выбраны тикеры для загрузки")
+            QMessageBox.warning(self, "Ошибка", "Не выбраны тикеры для загрузки")
+            return
+        
+        start_date = utc(self.from_datetime.dateTime().toUTC().toPyDateTime())
+        end_date = utc(self.to_datetime.dateTime().toUTC().toPyDateTime())
+        
+        self.load_btn.setEnabled(False)
+        self.sync_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.setCursor(Qt.WaitCursor)
+
+        try:
+            settings = load_settings()
+            self.engine.settings = settings
+            self.engine.sink = make_sink(settings)
+            self.engine.download_threads = settings['threads']
+            self.engine.request_timeout = settings.get('request_timeout', self.engine.request_timeout)
+            self.engine.hedge_percentile = settings.get('hedge_percentile', 0)
+            
+            if sync:
+                run = self.engine.sync(selected_tickers, start_date)
+            else:
+                run = self.engine.run(selected_tickers, start_date, end_date)
+            success = await record_run(run, settings['trace_dir'], settings['profile'],
+                                       'sync' if sync else 'run')
+            
+            if not self.engine.shutdown:
+                if not success:
+                    self.update_status_bar("Некоторые задачи завершились с ошибками")
+                    QMessageBox.warning(self, "Предупреждение", 
+                                    "Некоторые задачи завершились с ошибками. Проверьте логи.")
+                else:
+                    self.update_status_bar("Данные успешно загружены")
+                    QMessageBox.information(self, "Успех", "Данные успешно загружены")
+                
+        except Exception as e:
+            self.update_status_bar(f"Ошибка: {str(e)}")
+            if not self.engine.shutdown:
+                QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке данных: {str(e)}")
+        finally:
+            self.load_btn.setEnabled(True)
+            self.sync_btn.setEnabled(True)
+            self.stop_btn.setEnabled(False)
+            self.setCursor(Qt.ArrowCursor)
+            self.global_progress.setValue(100)
+
+    async def estimate_loading(self):
+        from planner import estimate, format_report
+
+        selected_tickers = [self.tickers_table.item(row, 0).text() for row in range(self.tickers_table.rowCount())
+                            if self.tickers_table.item(row, 0).isSelected()]
+        if not selected_tickers:
+            QMessageBox.warning(self, "Ошибка", "Не выбраны тикеры для оценки")
+            return
+
+        start_date = utc(self.from_datetime.dateTime().toUTC().toPyDateTime())
+        end_date = utc(self.to_datetime.dateTime().toUTC().toPyDateTime())
+        self.plan_btn.setEnabled(False)
+        self.setCursor(Qt.WaitCursor)
+        try:
+            settings = load_settings()
+            self.engine.settings = settings
+            self.engine.sink = make_sink(settings)
+            self.engine.download_threads = settings['threads']
+            periods = await self.engine.plan(selected_tickers, *self.engine.run_planner(start_date, end_date))
+            report = format_report(estimate(self.engine, periods))
+            self.update_status_bar("Оценка загрузки готова")
+            box = QMessageBox(QMessageBox.Information, "Оценка загрузки", report.splitlines()[-2], parent=self)
+            box.setDetailedText(report)
+            box.exec_()
+        except Exception as e:
+            self.update_status_bar(f"Ошибка: {str(e)}")
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при оценке загрузки: {str(e)}")
+        finally:
+            self.plan_btn.setEnabled(True)
+            self.setCursor(Qt.ArrowCursor)
+
+
+def run_app():
+    # Устанавливаем политику event loop для Windows
+    if sys.platform == 'win32':
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    
+    app = QApplication(sys.argv)
+    
+    # Настройки для Windows
+    if sys.platform == 'win32':
+        app.setAttribute(Qt.AA_DisableWindowContextHelpButton)
+        app.setStyle('Fusion')
+        app.setAttribute(Qt.AA_Use96Dpi)
+        import ctypes
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID('ByBitDownloader')
+    
+    # Настройка event loop
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    
+    # Создаем и настраиваем главное окно
+    window = MainWindow()
+    window.show()
+    
+    # Запускаем event loop
+    with loop:
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.close()
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+import aiohttp
+
+from timeutil import utc, utc_now, ms_to_datetime
+
+WS_URL = "wss://stream.bybit.com/v5/public/spot"
+SUBSCRIBE_BATCH = 10  # спот принимает не больше 10 топиков в одной подписке
+PING_INTERVAL = 20  # секунды, биржа закрывает соединение без ping
+FLUSH_INTERVAL = 1.0  # секунды между записями микро-пакетов
+FLUSH_SIZE = 500  # максимум свечей в одном пакете записи
+RECONNECT_DELAY_MAX = 30  # секунды
+
+
+def kline_from_ws(bar):
+    """Переводит свечу из WebSocket в формат списка REST API"""
+    return [
+        str(bar['start']), bar['open'], bar['high'], bar['low'],
+        bar['close'], bar['volume'], bar['turnover']
+    ]
+
+
+class LiveTail:
+    """Поддерживает таблицы актуальными по потоку kline.1.<symbol>.
+
+    Закрытые свечи (confirm=true) копятся в буфере и пишутся микро-пакетами
+    через engine.save_klines в хранилище движка. При каждом (пере)подключении пропуск от последней
+    сохраненной свечи до текущего момента догружается через REST
+    (engine.download_symbol_data -> fetch_klines).
+    """
+
+    def __init__(self, engine, symbols, ws_url=WS_URL,
+                 flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE):
+        self.engine = engine
+        self.symbols = list(symbols)
+        self.ws_url = ws_url
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.buffer = {symbol: {} for symbol in self.symbols}
+        self.last_saved = {}
+        self.unfilled = {}  # {тикер: начало дыры}, которую не удалось догрузить через REST
+        self.buffered = asyncio.Event()
+        self.bars_saved = 0
+        self.reconnects = 0
+
+    async def run(self, default_start):
+        """Работает до остановки engine.shutdown. Тикеры без истории догружаются с default_start"""
+        engine = self.engine
+        engine.shutdown = False
+        await engine.sink.open(engine.download_threads)
+        try:
+            await engine.sink.bootstrap(self.symbols)
+            self.last_saved = await engine.sink.watermarks(self.symbols)
+
+            flusher = asyncio.create_task(self.flush_loop())
+            try:
+                async with aiohttp.ClientSession() as session:
+                    await self.stream(session, default_start)
+            finally:
+                flusher.cancel()
+                await asyncio.gather(flusher, return_exceptions=True)
+                await self.flush()
+        finally:
+            await engine.sink.close()
+
+    async def stream(self, session, default_start):
+        delay = 1
+        while not self.engine.shutdown:
+            try:
+                async with session.ws_connect(self.ws_url) as ws:
+                    await self.subscribe(ws)
+                    self.engine.update_status(f"Поток подключен: {len(self.symbols)} тикеров")
+                    delay = 1
+
+                    # Пока соединения не было, свечи шли мимо - добираем через REST
+                    gap_fill = asyncio.create_task(self.gap_fill(default_start))
+                    pinger = asyncio.create_task(self.ping_loop(ws))
+                    try:
+                        async for message in ws:
+                            if message.type == aiohttp.WSMsgType.TEXT:
+                                self.handle_message(message.data)
+                            elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                            if self.engine.shutdown:
+                                break
+                    finally:
+                        pinger.cancel()
+                        await asyncio.gather(pinger, return_exceptions=True)
+                        await gap_fill
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Ошибка потока свечей: {str(e)}")
+
+            if self.engine.shutdown:
+                break
+            self.reconnects += 1
+            self.engine.update_status(f"Поток отключен, переподключение через {delay} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    async def subscribe(self, ws):
+        topics = [f"kline.1.{symbol}" for symbol in self.symbols]
+        for i in range(0, len(topics), SUBSCRIBE_BATCH):
+            await ws.send_json({'op': 'subscribe', 'args': topics[i:i + SUBSCRIBE_BATCH]})
+
+    async def ping_loop(self, ws):
+        while not ws.closed:
+            await asyncio.sleep(PING_INTERVAL)
+            await ws.send_json({'op': 'ping'})
+
+    def handle_message(self, raw):
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logging.error(f"Некорректное сообщение потока: {raw[:200]}")
+            return
+
+        topic = message.get('topic', '')
+        if not topic.startswith('kline.'):
+            if message.get('op') == 'subscribe' and not message.get('success', True):
+                logging.error(f"Ошибка подписки: {message.get('ret_msg')}")
+            return
+
+        symbol = topic.rsplit('.', 1)[-1]
+        if symbol not in self.buffer:
+            return
+        for bar in message.get('data', []):
+            if bar.get('confirm'):
+                self.buffer[symbol][int(bar['start'])] = kline_from_ws(bar)
+                self.buffered.set()
+
+    async def gap_fill(self, default_start):
+        """Догружает через REST минуты от последней сохраненной свечи до текущего момента"""
+        semaphore = asyncio.Semaphore(self.engine.download_threads)
+        now = utc_now().replace(second=0, microsecond=0)
+        symbols, starts, tasks = [], [], []
+        for symbol in self.symbols:
+            last = self.last_saved.get(symbol)
+            start = last + timedelta(minutes=1) if last is not None else utc(default_start)
+            # Записанные из потока свечи сдвигают last_saved дальше дыры, поэтому она хранится отдельно
+            start = min(start, self.unfilled.get(symbol, start))
+            if start < now:
+                symbols.append(symbol)
+                starts.append(start)
+                tasks.append(self.engine.download_symbol_data(symbol, start, now, semaphore))
+        if not tasks:
+            return
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        filled_to = now - timedelta(minutes=1)
+        for symbol, start, result in zip(symbols, starts, results):
+            # Неудачная догрузка не сдвигает отметку: дыра догружается при следующем переподключении
+            if result is not True or self.engine.shutdown:
+                self.unfilled[symbol] = start
+                logging.warning(f"Догрузка {symbol} с {start} не удалась, повтор при следующем переподключении")
+                continue
+            self.unfilled.pop(symbol, None)
+            last = self.last_saved.get(symbol)
+            if last is None or last < filled_to:
+                self.last_saved[symbol] = filled_to
+
+    async def flush_loop(self):
+        while True:
+            await self.buffered.wait()
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        self.buffered.clear()
+        for symbol, bars in self.buffer.items():
+            if not bars:
+                continue
+            self.buffer[symbol] = {}
+            keys = sorted(bars)
+            for i in range(0, len(keys), self.flush_size):
+                chunk = [bars[key] for key in keys[i:i + self.flush_size]]
+                try:
+                    if not await self.engine.save_klines(symbol, chunk):
+                        continue  # остановка: минуты догрузит gap fill при следующем запуске
+                except Exception as e:
+                    logging.error(f"Ошибка записи потока для {symbol}: {str(e)}")
+                    continue
+                self.bars_saved += len(chunk)
+                last = ms_to_datetime(keys[min(i + self.flush_size, len(keys)) - 1])
+                if self.last_saved.get(symbol) is None or last > self.last_saved[symbol]:
+                    self.last_saved[symbol] = last
+        self.engine.update_status(f"Поток: записано {self.bars_saved} свечей")
+
@@ -0,0 +1,224 @@
+"""Метрики загрузчика в формате Prometheus.
+
+Реестр без внешних зависимостей: счетчики, гейджи и гистограммы с метками.
+Экспортер /metrics поднимается по желанию на aiohttp в том же event loop.
+"""
+import bisect
+import logging
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        if not self.labelnames:
+            self.children[()] = self._new_child()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}")
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        self.children.pop(tuple(str(value) for value in values), None)
+
+    def _default(self):
+        return self.children[()]
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self.children.items()):
+            lines.extend(self._samples(key, child))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def get(self):
+        return self._default().value
+
+    def _samples(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _samples(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+        lines.append(f"{self.name}_bucket{labels} {child.count}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self.metrics[metric.name] = metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Запросы к бирже (fetch_klines)
+REQUEST_LATENCY = Histogram('bybit_request_duration_seconds',
+                            'Длительность одной попытки запроса kline', ['result'])
+REQUEST_RETRIES = Counter('bybit_request_retries_total',
+                          'Неудачные попытки запроса kline по причине', ['cause'])
+REQUEST_FAILURES = Counter('bybit_request_failures_total',
+                           'Запросы kline, не выполненные после всех попыток')
+HEDGED_REQUESTS = Counter('bybit_hedged_requests_total', 'Дублирующие запросы при медленном ответе')
+BREAKER_OPEN = Gauge('bybit_circuit_breaker_open', '1, пока запросы к бирже приостановлены')
+BREAKER_TRIPS = Counter('bybit_circuit_breaker_trips_total', 'Срабатывания circuit breaker')
+
+# Запись в базу (save_klines)
+ROWS_WRITTEN = Counter('db_rows_written_total', 'Записанные в базу свечи')
+SAVE_LATENCY = Histogram('db_save_batch_duration_seconds', 'Длительность записи одного пакета свечей')
+POOL_WAIT = Histogram('db_pool_acquire_wait_seconds', 'Ожидание соединения из пула',
+                      buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10))
+
+# Состояние конвейера
+QUEUE_DEPTH = Gauge('download_queue_depth', 'Тикеры, ожидающие в очереди загрузки')
+ACTIVE_WORKERS = Gauge('download_active_workers', 'Активные задачи загрузки периодов')
+SYMBOL_LAG = Gauge('symbol_lag_seconds', 'Отставание последней записанной свечи от текущего времени', ['symbol'])
+
+
+async def start_http_server(port, host='0.0.0.0', registry=REGISTRY):
+    """Поднимает /metrics в текущем event loop. Возвращает runner для остановки"""
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(body=registry.render().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
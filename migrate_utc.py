@@ -0,0 +1,85 @@
+"""Перевод таблиц klines_* на TIMESTAMPTZ (UTC).
+
+Раньше время свечей сохранялось в колонке TIMESTAMP как местное время
+машины загрузчика. На переходах на летнее и зимнее время местные минуты
+дублировались или пропадали, поиск пропусков находил их при каждом запуске
+и качал заново. Скрипт переводит колонку в TIMESTAMPTZ, считая старые
+значения временем пояса --source-tz. Пояс указывается явно: TimeZone
+сервера Postgres не обязан совпадать с поясом машины загрузчика.
+
+Час, который в исходном поясе повторяется при переводе часов назад, хранит
+в одних строках свечи двух разных часов UTC (второй перезаписывал первый),
+и отличить их нельзя. Такие строки (и строки с несуществующим местным
+временем, если они есть) удаляются: после миграции оба часа UTC становятся
+пропусками и загружаются заново при следующем запуске.
+
+    python migrate_utc.py --source-tz Europe/Moscow --dry-run
+    python migrate_utc.py --source-tz Europe/Moscow
+"""
+import argparse
+import asyncio
+import time
+
+from config import load_settings
+from sinks import LEGACY_TABLES_QUERY
+
+# Местное время неоднозначно, если в него переводится и момент на час раньше
+# или позже (переходы на 30 минут, как в Australia/Lord_Howe, не учитываются),
+# и не существует, если не переводится обратно в себя
+DOUBTFUL_CONDITION = (
+    "((timestamp AT TIME ZONE '{zone}') + interval '1 hour') AT TIME ZONE '{zone}' = timestamp "
+    "OR ((timestamp AT TIME ZONE '{zone}') - interval '1 hour') AT TIME ZONE '{zone}' = timestamp "
+    "OR (timestamp AT TIME ZONE '{zone}') AT TIME ZONE '{zone}' <> timestamp"
+)
+
+
+async def migrate(settings, source_tz, dry_run=False):
+    import asyncpg
+
+    if not source_tz:
+        raise ValueError("Не указан исходный часовой пояс (--source-tz)")
+    schema = settings.get('schema', 'bybit_data')
+    conn = await asyncpg.connect(
+        host=settings.get('host'),
+        port=settings.get('port', '5432'),
+        user=settings.get('user'),
+        password=settings.get('password'),
+        database=settings.get('database')
+    )
+    try:
+        if not await conn.fetchval("SELECT EXISTS (SELECT 1 FROM pg_timezone_names WHERE name = $1)", source_tz):
+            raise ValueError(f"Postgres не знает часовой пояс {source_tz}")
+
+        tables = [row['table_name'] for row in await conn.fetch(LEGACY_TABLES_QUERY, schema)]
+        print(f"Таблиц для перевода в схеме {schema}: {len(tables)}, исходный пояс: {source_tz}")
+        zone = source_tz.replace("'", "''")
+        doubtful = DOUBTFUL_CONDITION.format(zone=zone)
+        for table in tables:
+            if dry_run:
+                count = await conn.fetchval(f"SELECT count(*) FROM {schema}.{table} WHERE {doubtful}")
+                print(f"  {table}: строк на переходах часов (будут удалены): {count}")
+                continue
+            started = time.perf_counter()
+            async with conn.transaction():
+                deleted = await conn.execute(f"DELETE FROM {schema}.{table} WHERE {doubtful}")
+                await conn.execute(
+                    f"ALTER TABLE {schema}.{table} ALTER COLUMN timestamp TYPE TIMESTAMPTZ "
+                    f"USING timestamp AT TIME ZONE '{zone}'"
+                )
+            print(f"  {table}: удалено строк на переходах часов {deleted.split()[-1]}, "
+                  f"{time.perf_counter() - started:.1f} с")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перевод таблиц klines_* на TIMESTAMPTZ (UTC)")
+    parser.add_argument('--source-tz', required=True,
+                        help="часовой пояс машины, на которой сохранялись старые данные (например Europe/Moscow)")
+    parser.add_argument('--dry-run', action='store_true', help="только показать таблицы и число удаляемых строк")
+    args = parser.parse_args()
+    asyncio.run(migrate(load_settings(), args.source_tz, args.dry_run))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""Плотное локальное хранилище минутных свечей в memory-mapped файлах.
+
+На тикер в папке хранилища лежат три файла:
+
+    <SYMBOL>.bars  - запись на каждую минуту от base_ms: 6 x float64
+                     (open, high, low, close, volume, turnover), пропуски - NaN;
+    <SYMBOL>.mask  - битовая карта наличия свечи, бит на минуту (младший бит первый);
+    <SYMBOL>.json  - заголовок: версия формата и base_ms.
+
+Минута t лежит в записи (t - base_ms) // 60000, поэтому поиск пропусков -
+это просмотр битовой карты, а чтение периода - срез файла без разбора.
+Файлы растут блоками по 30 дней. Пишет в хранилище один процесс.
+
+Перенос данных между таблицами klines_* в Postgres и хранилищем:
+
+    python minutestore.py import --tickers BTCUSDT ETHUSDT
+    python minutestore.py export --tickers BTCUSDT --dir minutes
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+
+from timeutil import utc, utc_now, ms_to_datetime
+
+FORMAT_VERSION = 1
+STORE_DIR = "minutes"
+COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'turnover')
+RECORD_SIZE = 8 * len(COLUMNS)
+MINUTE_MS = 60000
+DAY_MS = 1440 * MINUTE_MS
+GROW_MINUTES = 30 * 1440  # кратно 8, чтобы байты карты не делились между блоками
+TRANSFER_CHUNK = 100_000  # минут в одном пакете import/export
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Для хранилища mmap установите numpy: pip install numpy") from None
+    return numpy
+
+
+class MinuteStore:
+    """Свечи одного тикера. Файлы создаются при первой записи"""
+
+    def __init__(self, root, symbol):
+        self.root = root
+        self.symbol = symbol
+        self.path = os.path.join(root, symbol)
+        self.base_ms = None
+        self.bars = None
+        self.mask = None
+        self.load()
+
+    @property
+    def capacity(self):
+        return 0 if self.bars is None else len(self.bars)
+
+    def load(self):
+        if not os.path.exists(self.path + '.json'):
+            return
+        try:
+            with open(self.path + '.json', encoding='utf-8') as f:
+                header = json.load(f)
+            version, base_ms = header.get('version'), header['base_ms']
+        except (ValueError, KeyError, AttributeError) as e:
+            raise ValueError(f"Поврежден заголовок хранилища {self.path}.json: {str(e)}") from None
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия хранилища {self.path}: {version}")
+        self.base_ms = base_ms
+        if 'rebase_to' in header:
+            self._finish_rebase(header['rebase_to'])
+        else:
+            for suffix in ('.bars.tmp', '.mask.tmp'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)  # rebase прервался до подмены файлов
+
+        sizes = [os.path.getsize(self.path + suffix) if os.path.exists(self.path + suffix) else 0
+                 for suffix in ('.bars', '.mask')]
+        records = min(sizes[0] // RECORD_SIZE, sizes[1] * 8)  # записи, покрытые обоими файлами
+        capacity = max(-(-sizes[0] // RECORD_SIZE), sizes[1] * 8)
+        capacity = -(-capacity // GROW_MINUTES) * GROW_MINUTES
+        if sizes != [capacity * RECORD_SIZE, capacity // 8]:
+            # Рост файлов прервался между truncate: дотягиваем оба до большего блока,
+            # новые биты карты нулевые - эти минуты считаются пропусками
+            logging.warning(f"Размеры файлов хранилища {self.path} не согласованы "
+                            f"(.bars {sizes[0]} байт, .mask {sizes[1]} байт), файлы дополнены")
+            for suffix, size in (('.bars', capacity * RECORD_SIZE), ('.mask', capacity // 8)):
+                with open(self.path + suffix, 'ab') as f:
+                    f.truncate(size)
+            self._map(capacity)
+            if self.bars is not None:
+                self.bars[records:] = _numpy().nan
+            return
+        self._map(capacity)
+
+    def _map(self, capacity):
+        np = _numpy()
+        if not capacity:
+            self.bars = self.mask = None
+            return
+        self.bars = np.memmap(self.path + '.bars', dtype='float64', mode='r+', shape=(capacity, len(COLUMNS)))
+        self.mask = np.memmap(self.path + '.mask', dtype='uint8', mode='r+', shape=(capacity // 8,))
+
+    def _unmap(self):
+        if self.bars is not None:
+            self.bars.flush()
+            self.mask.flush()
+        self.bars = self.mask = None
+
+    def _write_header(self, **extra):
+        tmp_path = self.path + '.json.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': FORMAT_VERSION, 'base_ms': self.base_ms, 'columns': list(COLUMNS), **extra}, f)
+        os.replace(tmp_path, self.path + '.json')
+
+    def _resize(self, capacity):
+        """Растягивает файлы до capacity минут (с округлением до блока), новые записи - NaN"""
+        capacity = -(-capacity // GROW_MINUTES) * GROW_MINUTES
+        old = self.capacity
+        self._unmap()
+        for suffix, size in (('.bars', capacity * RECORD_SIZE), ('.mask', capacity // 8)):
+            with open(self.path + suffix, 'ab') as f:
+                f.truncate(size)
+        self._map(capacity)
+        self.bars[old:] = _numpy().nan
+
+    def _rebase(self, base_ms):
+        """Переносит начало хранилища на более раннюю минуту.
+
+        Новые файлы собираются рядом (.tmp), затем заголовок отмечает перенос
+        (rebase_to), файлы подменяются и заголовок получает новый base_ms. Если
+        процесс прервется, load() завершит подмену или удалит недописанные .tmp.
+        """
+        np = _numpy()
+        shift = (self.base_ms - base_ms) // MINUTE_MS
+        old = self.capacity
+        capacity = -(-(shift + old) // GROW_MINUTES) * GROW_MINUTES
+        bars = np.memmap(self.path + '.bars.tmp', dtype='float64', mode='w+', shape=(capacity, len(COLUMNS)))
+        mask = np.memmap(self.path + '.mask.tmp', dtype='uint8', mode='w+', shape=(capacity // 8,))
+        bars[:] = np.nan
+        bars[shift:shift + old] = self.bars
+        mask[shift // 8:shift // 8 + len(self.mask)] = self.mask
+        bars.flush()
+        mask.flush()
+        del bars, mask
+        self._unmap()
+
+        self._write_header(rebase_to=base_ms)
+        self._finish_rebase(base_ms)
+        self._map(capacity)
+
+    def _finish_rebase(self, base_ms):
+        """Подменяет файлы собранными в _rebase и записывает заголовок с новым base_ms"""
+        for suffix in ('.mask', '.bars'):
+            if os.path.exists(self.path + suffix + '.tmp'):
+                os.replace(self.path + suffix + '.tmp', self.path + suffix)
+        self.base_ms = base_ms
+        self._write_header()
+
+    def write(self, timestamps, values):
+        """Записывает свечи: timestamps - epoch ms, values - массив (n, 6)"""
+        np = _numpy()
+        timestamps = np.asarray(timestamps, dtype='int64')
+        if not len(timestamps):
+            return
+        values = np.asarray(values, dtype='float64').reshape(len(timestamps), len(COLUMNS))
+
+        # Начало хранилища выровнено по суткам, чтобы сдвиг при rebase был кратен байту карты
+        first_day = int(timestamps.min()) // DAY_MS * DAY_MS
+        if self.base_ms is None:
+            # Заголовок пишется последним: без него остатки файлов прошлой попытки не читаются
+            os.makedirs(self.root, exist_ok=True)
+            for suffix in ('.bars', '.mask'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+            self.base_ms = first_day
+            self._resize((int(timestamps.max()) - first_day) // MINUTE_MS + 1)
+            self._write_header()
+        elif first_day < self.base_ms:
+            self._rebase(first_day)
+
+        index = (timestamps - self.base_ms) // MINUTE_MS
+        if index.max() >= self.capacity:
+            self._resize(int(index.max()) + 1)
+        self.bars[index] = values
+
+        low, high = int(index.min()) >> 3, (int(index.max()) >> 3) + 1
+        bits = np.unpackbits(self.mask[low:high], bitorder='little')
+        bits[index - low * 8] = 1
+        self.mask[low:high] = np.packbits(bits, bitorder='little')
+
+    def write_klines(self, klines):
+        """Записывает свечи в формате REST API"""
+        np = _numpy()
+        timestamps = np.fromiter((int(kline[0]) for kline in klines), dtype='int64', count=len(klines))
+        values = np.array([kline[1:7] for kline in klines], dtype='float64')
+        self.write(timestamps, values)
+
+    def _index_range(self, start_ms, end_ms):
+        """Индексы записей [i0, i1) для минут из [start_ms, end_ms)"""
+        return (-(-(start_ms - self.base_ms) // MINUTE_MS), -(-(end_ms - self.base_ms) // MINUTE_MS))
+
+    def present(self, start_ms, end_ms):
+        """Маска наличия свечей по минутам [start_ms, end_ms)"""
+        np = _numpy()
+        i0, i1 = self._index_range(start_ms, end_ms)
+        result = np.zeros(max(i1 - i0, 0), dtype=bool)
+        low, high = max(i0, 0), min(i1, self.capacity)
+        if low < high:
+            bits = np.unpackbits(self.mask[low >> 3:(high + 7) >> 3], bitorder='little')
+            result[low - i0:high - i0] = bits[low & 7:(low & 7) + high - low]
+        return result
+
+    def missing(self, start_ms, end_ms):
+        """Отрезки пропусков [(first_ms, last_ms)] среди минут [start_ms, end_ms] включительно"""
+        np = _numpy()
+        start_ms = -(-start_ms // MINUTE_MS) * MINUTE_MS
+        end_ms = end_ms // MINUTE_MS * MINUTE_MS
+        if start_ms > end_ms:
+            return []
+        if self.base_ms is None:
+            return [(start_ms, end_ms)]
+        absent = ~self.present(start_ms, end_ms + MINUTE_MS)
+        edges = np.flatnonzero(np.diff(np.concatenate(([False], absent, [False])).astype('int8')))
+        return [(start_ms + int(first) * MINUTE_MS, start_ms + (int(last) - 1) * MINUTE_MS)
+                for first, last in zip(edges[::2], edges[1::2])]
+
+    def read(self, start_ms, end_ms, columns=COLUMNS):
+        """Свечи за [start_ms, end_ms) по минутной сетке.
+
+        Словарь: 'timestamp' (datetime64[ms]), 'present' (bool) и колонки
+        (float64, NaN без свечи). Если период целиком внутри хранилища,
+        колонки - срезы memory-mapped файла без копирования.
+        """
+        np = _numpy()
+        start_ms = -(-start_ms // MINUTE_MS) * MINUTE_MS
+        length = max(-(-(end_ms - start_ms) // MINUTE_MS), 0)
+        chunk = {'timestamp': np.arange(start_ms, start_ms + length * MINUTE_MS, MINUTE_MS,
+                                        dtype='int64').view('datetime64[ms]')}
+        if self.base_ms is None:
+            chunk['present'] = np.zeros(length, dtype=bool)
+            chunk.update((column, np.full(length, np.nan)) for column in columns)
+            return chunk
+
+        i0, i1 = self._index_range(start_ms, start_ms + length * MINUTE_MS)
+        chunk['present'] = self.present(start_ms, start_ms + length * MINUTE_MS)
+        if 0 <= i0 and i1 <= self.capacity:
+            for column in columns:
+                chunk[column] = self.bars[i0:i1, COLUMNS.index(column)]
+            return chunk
+
+        low, high = max(i0, 0), min(i1, self.capacity)
+        for column in columns:
+            values = np.full(length, np.nan)
+            if low < high:
+                values[low - i0:high - i0] = self.bars[low:high, COLUMNS.index(column)]
+            chunk[column] = values
+        return chunk
+
+    def aggregate(self, start_ms, end_ms, bucket_minutes):
+        """max(high), min(low), суммы volume/turnover и число свечей по интервалам
+        bucket_minutes от начала эпохи среди минут [start_ms, end_ms] включительно"""
+        np = _numpy()
+        chunk = self.read(start_ms, end_ms + MINUTE_MS, ('high', 'low', 'volume', 'turnover'))
+        present = chunk['present']
+        if not present.any():
+            return {}
+        step = bucket_minutes * MINUTE_MS
+        keys = chunk['timestamp'].view('int64')[present] // step * step
+        # Минуты отсортированы: интервал - непрерывный отрезок одинаковых ключей
+        starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+        columns = {
+            'high': np.maximum.reduceat(chunk['high'][present], starts),
+            'low': np.minimum.reduceat(chunk['low'][present], starts),
+            'volume': np.add.reduceat(chunk['volume'][present], starts),
+            'turnover': np.add.reduceat(chunk['turnover'][present], starts),
+            'minutes': np.diff(np.append(starts, len(keys))),
+        }
+        lists = {name: values.tolist() for name, values in columns.items()}
+        return {
+            key: {name: values[i] for name, values in lists.items()}
+            for i, key in enumerate(keys[starts].tolist())
+        }
+
+    def _bit_bound(self, last):
+        np = _numpy()
+        if self.mask is None:
+            return None
+        nonzero = np.flatnonzero(self.mask)
+        if not len(nonzero):
+            return None
+        byte = int(nonzero[-1] if last else nonzero[0])
+        value = int(self.mask[byte])
+        bit = value.bit_length() - 1 if last else (value & -value).bit_length() - 1
+        return self.base_ms + (byte * 8 + bit) * MINUTE_MS
+
+    def first_ms(self):
+        """Время первой сохраненной свечи или None"""
+        return self._bit_bound(last=False)
+
+    def last_ms(self):
+        """Время последней сохраненной свечи или None"""
+        return self._bit_bound(last=True)
+
+    def flush(self):
+        if self.bars is not None:
+            self.bars.flush()
+            self.mask.flush()
+
+    def close(self):
+        self._unmap()
+
+
+async def import_from_postgres(settings, symbols, root, start, end):
+    """Копирует свечи из таблиц klines_* в хранилище"""
+    from reader import KlineReader
+
+    np = _numpy()
+    async with KlineReader(settings) as reader:
+        for symbol in symbols:
+            store = MinuteStore(root, symbol)
+            rows = 0
+            try:
+                async for chunk in reader.read(symbol, start, end):
+                    values = np.column_stack([chunk[column] for column in COLUMNS])
+                    store.write(chunk['timestamp'].astype('int64'), values)
+                    rows += len(values)
+            finally:
+                store.close()
+            print(f"{symbol}: импортировано {rows} свечей")
+
+
+async def export_to_postgres(settings, symbols, root):
+    """Копирует свечи из хранилища в таблицы klines_* (повторы минут перезаписываются)"""
+    from sinks import PostgresSink
+
+    sink = PostgresSink(settings)
+    await sink.open(2)
+    try:
+        for symbol in symbols:
+            store = MinuteStore(root, symbol)
+            first, last = store.first_ms(), store.last_ms()
+            if first is None:
+                print(f"{symbol}: нет данных")
+                continue
+            await sink.ensure_table(symbol)
+            rows = 0
+            for chunk_start in range(first, last + MINUTE_MS, TRANSFER_CHUNK * MINUTE_MS):
+                chunk = store.read(chunk_start, min(chunk_start + TRANSFER_CHUNK * MINUTE_MS, last + MINUTE_MS))
+                present = chunk['present']
+                timestamps = chunk['timestamp'][present].astype('int64').tolist()
+                values = zip(*(chunk[column][present].tolist() for column in COLUMNS))
+                records = [(ms_to_datetime(ts),) + row for ts, row in zip(timestamps, values)]
+                await sink.bulk_write(symbol, records)
+                rows += len(records)
+            store.close()
+            print(f"{symbol}: экспортировано {rows} свечей")
+    finally:
+        await sink.close()
+
+
+def main():
+    from config import load_settings
+
+    parser = argparse.ArgumentParser(description="Перенос свечей между Postgres и хранилищем mmap")
+    parser.add_argument('command', choices=('import', 'export'),
+                        help="import: Postgres -> хранилище, export: хранилище -> Postgres")
+    parser.add_argument('--tickers', nargs='+', help="по умолчанию сохраненные в settings.ini")
+    parser.add_argument('--dir', default=None, help="папка хранилища (по умолчанию из settings.ini)")
+    parser.add_argument('--from', dest='start_date', default='2018-01-01', help="начало периода импорта (UTC), YYYY-MM-DD")
+    parser.add_argument('--to', dest='end_date', default=None, help="конец периода импорта (UTC), YYYY-MM-DD")
+    args = parser.parse_args()
+
+    settings = load_settings()
+    symbols = args.tickers or settings['selected_tickers']
+    root = args.dir or settings['mmap_dir']
+    if args.command == 'import':
+        start = utc(datetime.strptime(args.start_date, '%Y-%m-%d'))
+        end = utc(datetime.strptime(args.end_date, '%Y-%m-%d')) if args.end_date else utc_now()
+        asyncio.run(import_from_postgres(settings, symbols, root, start, end))
+    else:
+        asyncio.run(export_to_postgres(settings, symbols, root))
+
+
+if __name__ == '__main__':
+    main()
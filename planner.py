@@ -0,0 +1,114 @@
+"""Оценка загрузки без скачивания и задания загрузки.
+
+План - пропуски по тикерам (DownloadEngine.plan). По нему считаются
+минуты, запросы после упаковки окон, время при лимите биржи и числе
+потоков, строки и объем на диске. План сохраняется в JSON как задание,
+которое потом выполняет DownloadEngine.run_job():
+
+    python ByBitDownloader.py --headless --plan --save-job backfill.json
+    python ByBitDownloader.py --headless --job backfill.json
+"""
+import json
+import os
+from datetime import timedelta
+
+from engine import PLAN_LATENCY, WINDOW_PAUSE, pack_periods, period_minutes, request_count
+from sinks import SINKS
+from timeutil import utc_now, ms_to_datetime, datetime_to_ms
+
+JOB_VERSION = 1
+
+
+def estimate(engine, periods):
+    """Сводка по плану {тикер: [(start, end), ...]}: словарь по тикерам и итог"""
+    latency = engine.latency.percentile(0.5) or PLAN_LATENCY
+    # Поток делает запрос и паузу между окнами, все потоки вместе - не быстрее лимита биржи
+    per_request = latency + WINDOW_PAUSE
+
+    def wall_time(requests, longest, parallel):
+        if not requests:
+            return 0.0
+        return max(requests / engine.rate_limit, requests * per_request / parallel, longest * per_request)
+
+    symbols = {}
+    for symbol, missing in periods.items():
+        packed = pack_periods(missing, engine.kline_limit)
+        counts = [request_count(start, end, engine.kline_limit) for start, end in packed]
+        # Упакованные окна захватывают и сохраненные минуты между пропусками: они
+        # перезаписываются и не добавляют строк, поэтому строки и объем - по пропускам
+        rows = sum(period_minutes(start, end) for start, end in missing)
+        symbols[symbol] = {
+            'missing_minutes': rows,
+            'periods': packed,
+            'requests': sum(counts),
+            'longest': max(counts, default=0),
+            'rows': rows,
+            'bytes': rows * engine.sink.row_bytes,
+            'seconds': wall_time(sum(counts), max(counts, default=0),
+                                 max(min(engine.download_threads, len(packed)), 1)),
+        }
+
+    requests = sum(plan['requests'] for plan in symbols.values())
+    total = {
+        'symbols': len(symbols),
+        'missing_minutes': sum(plan['missing_minutes'] for plan in symbols.values()),
+        'requests': requests,
+        'rows': sum(plan['rows'] for plan in symbols.values()),
+        'bytes': sum(plan['bytes'] for plan in symbols.values()),
+        'seconds': wall_time(requests, max((plan['longest'] for plan in symbols.values()), default=0),
+                             engine.download_threads),
+        'latency': latency,
+        'threads': engine.download_threads,
+        'rate_limit': engine.rate_limit,
+    }
+    return {'symbols': symbols, 'total': total}
+
+
+def format_report(report):
+    """Текстовая таблица плана для консоли и окна"""
+    def size(value):
+        return f"{value / 2 ** 20:.1f}"
+
+    lines = [f"{'тикер':16} {'пропуск, мин':>13} {'запросов':>9} {'строк':>11} {'МБ':>9} {'время':>10}"]
+    for symbol, plan in sorted(report['symbols'].items()):
+        lines.append(f"{symbol:16} {plan['missing_minutes']:13d} {plan['requests']:9d} {plan['rows']:11d} "
+                     f"{size(plan['bytes']):>9} {str(timedelta(seconds=round(plan['seconds']))):>10}")
+    total = report['total']
+    lines.append(f"{'Итого':16} {total['missing_minutes']:13d} {total['requests']:9d} {total['rows']:11d} "
+                 f"{size(total['bytes']):>9} {str(timedelta(seconds=round(total['seconds']))):>10}")
+    lines.append(f"Оценка времени: {total['threads']} потоков, лимит {total['rate_limit']} запросов/с, "
+                 f"задержка {total['latency'] * 1000:.0f} мс на запрос")
+    return "\n".join(lines)
+
+
+def save_job(path, report, settings=None):
+    """Сохраняет упакованные периоды плана как задание загрузки"""
+    job = {
+        'version': JOB_VERSION,
+        'created': utc_now().isoformat(),
+        'sink': (settings or {}).get('sink'),
+        'periods': {
+            symbol: [[datetime_to_ms(start), datetime_to_ms(end)] for start, end in plan['periods']]
+            for symbol, plan in report['symbols'].items() if plan['periods']
+        },
+        'total': dict(report['total']),
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def load_job(path):
+    """Читает задание: {тикер: [(start, end), ...]} для DownloadEngine.run_job"""
+    with open(path, encoding='utf-8') as f:
+        job = json.load(f)
+    if job.get('version') != JOB_VERSION:
+        raise ValueError(f"Неподдерживаемая версия задания {path}: {job.get('version')}")
+    unknown = [kind.strip() for kind in (job.get('sink') or 'postgres').split(',') if kind.strip() not in SINKS]
+    if unknown:
+        raise ValueError(f"Неизвестное хранилище в задании {path}: {', '.join(unknown)}")
+    return {
+        symbol: [(ms_to_datetime(start), ms_to_datetime(end)) for start, end in periods]
+        for symbol, periods in job['periods'].items()
+    }
@@ -0,0 +1,244 @@
+"""Потоковое чтение сохраненных свечей в колонки NumPy/Arrow.
+
+Данные читаются блоками фиксированного размера, поэтому память ограничена
+размером блока, а не длиной истории. Два способа чтения:
+
+    copy   - COPY ... TO STDOUT (FORMAT binary), разбор строк через NumPy
+             без создания Python объектов на каждую свечу (по умолчанию);
+    cursor - серверный курсор, строки asyncpg складываются в колонки.
+
+Пример:
+
+    from config import load_settings
+    from reader import KlineReader
+
+    async with KlineReader(load_settings()) as reader:
+        async for chunk in reader.read('BTCUSDT', start, end):
+            chunk['timestamp'], chunk['close']  # numpy массивы
+
+NumPy обязателен, pyarrow - только для arrow=True.
+"""
+import asyncio
+import struct
+
+from timeutil import utc, ms_to_datetime, datetime_to_ms
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'turnover')
+CHUNK_SIZE = 100_000  # строк в одном блоке
+COPY_QUEUE_SIZE = 8  # сырых блоков COPY в очереди чтения
+
+_COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Для чтения свечей в колонки установите numpy: pip install numpy") from None
+    return numpy
+
+
+def _to_arrow(chunk):
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Для arrow=True установите pyarrow: pip install pyarrow") from None
+    return pyarrow.RecordBatch.from_pydict(chunk)
+
+
+class _BinaryCopyParser:
+    """Разбирает поток COPY binary из строк фиксированной ширины (int8 + float8 колонки)"""
+
+    def __init__(self, columns):
+        np = _numpy()
+        fields = [('field_count', '>i2'), ('timestamp_len', '>i4'), ('timestamp', '>i8')]
+        for column in columns:
+            fields += [(f"{column}_len", '>i4'), (column, '>f8')]
+        self.dtype = np.dtype(fields)
+        self.columns = columns
+        self.buffer = bytearray()
+        self.header_done = False
+
+    def feed(self, data):
+        np = _numpy()
+        self.buffer += data
+        if not self.header_done:
+            # Подпись, флаги и длина расширения заголовка
+            if len(self.buffer) < 19:
+                return None
+            if bytes(self.buffer[:11]) != _COPY_SIGNATURE:
+                raise ValueError("Неожиданный формат COPY")
+            extension = struct.unpack('>i', self.buffer[15:19])[0]
+            if len(self.buffer) < 19 + extension:
+                return None
+            del self.buffer[:19 + extension]
+            self.header_done = True
+
+        rows = len(self.buffer) // self.dtype.itemsize
+        if not rows:
+            return None
+        size = rows * self.dtype.itemsize
+        records = np.frombuffer(bytes(self.buffer[:size]), dtype=self.dtype)
+        del self.buffer[:size]
+        return records
+
+
+class KlineReader:
+    def __init__(self, settings, chunk_size=CHUNK_SIZE, method='copy', pool_size=4):
+        self.settings = settings
+        self.schema = settings.get('schema', 'bybit_data')
+        self.chunk_size = chunk_size
+        self.method = method
+        self.pool_size = pool_size
+        self.pool = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def connect(self):
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(
+            host=self.settings.get('host'),
+            port=self.settings.get('port', '5432'),
+            user=self.settings.get('user'),
+            password=self.settings.get('password'),
+            database=self.settings.get('database'),
+            min_size=1,
+            max_size=self.pool_size
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    def _query(self, symbol, columns):
+        # Пропуски в данных приходят как NaN, чтобы строки COPY были фиксированной ширины
+        selected = ', '.join(f"coalesce({column}, 'NaN')::float8" for column in columns)
+        return (
+            f"SELECT (extract(epoch FROM timestamp) * 1000)::int8, {selected} "
+            f"FROM {self.schema}.klines_{symbol.lower()} "
+            f"WHERE timestamp >= $1 AND timestamp < $2 ORDER BY timestamp"
+        )
+
+    async def read(self, symbol, start, end, columns=COLUMNS, arrow=False):
+        """Асинхронно отдает блоки свечей тикера за [start, end).
+
+        Блок - словарь колонок: 'timestamp' (datetime64[ms]) и запрошенные
+        колонки (float64), длиной до chunk_size строк. С arrow=True блоки
+        отдаются как pyarrow.RecordBatch.
+        """
+        read_chunks = self._read_copy if self.method == 'copy' else self._read_cursor
+        async for chunk in read_chunks(symbol, utc(start), utc(end), tuple(columns)):
+            yield _to_arrow(chunk) if arrow else chunk
+
+    async def _read_cursor(self, symbol, start, end, columns):
+        np = _numpy()
+        query = self._query(symbol, columns)
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                cursor = await conn.cursor(query, start, end)
+                while True:
+                    rows = await cursor.fetch(self.chunk_size)
+                    if not rows:
+                        break
+                    chunk = {'timestamp': np.fromiter((row[0] for row in rows), dtype='int64',
+                                                      count=len(rows)).view('datetime64[ms]')}
+                    for i, column in enumerate(columns, start=1):
+                        chunk[column] = np.fromiter((row[i] for row in rows), dtype='float64', count=len(rows))
+                    yield chunk
+
+    async def _read_copy(self, symbol, start, end, columns):
+        np = _numpy()
+        parser = _BinaryCopyParser(columns)
+        queue = asyncio.Queue(maxsize=COPY_QUEUE_SIZE)
+
+        async def produce():
+            async def on_data(data):
+                await queue.put(data)
+
+            try:
+                async with self.pool.acquire() as conn:
+                    await conn.copy_from_query(self._query(symbol, columns), start, end,
+                                               output=on_data, format='binary')
+            except Exception as e:
+                await queue.put(e)
+                return
+            await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        pending = []
+        pending_rows = 0
+        try:
+            while True:
+                data = await queue.get()
+                if isinstance(data, Exception):
+                    raise data
+                if data is not None:
+                    records = parser.feed(data)
+                    if records is not None:
+                        pending.append(records)
+                        pending_rows += len(records)
+                if pending_rows >= self.chunk_size or (data is None and pending_rows):
+                    records = np.concatenate(pending) if len(pending) > 1 else pending[0]
+                    while len(records) >= self.chunk_size or (data is None and len(records)):
+                        yield self._columns(records[:self.chunk_size], columns)
+                        records = records[self.chunk_size:]
+                    pending = [records] if len(records) else []
+                    pending_rows = len(records)
+                if data is None:
+                    break
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    @staticmethod
+    def _columns(records, columns):
+        chunk = {'timestamp': records['timestamp'].astype('int64').view('datetime64[ms]')}
+        for column in columns:
+            chunk[column] = records[column].astype('float64')
+        return chunk
+
+    async def read_aligned(self, symbols, start, end, columns=('close',), arrow=False):
+        """Отдает блоки по общей минутной сетке для нескольких тикеров.
+
+        Блок - словарь: 'timestamp' (datetime64[ms], шаг 1 минута) и колонки
+        '<SYMBOL>.<column>' (float64, NaN там, где свечи нет). Тикеры
+        одного блока читаются параллельно.
+        """
+        np = _numpy()
+        start_ms = datetime_to_ms(start) // 60000 * 60000
+        end_ms = datetime_to_ms(end) // 60000 * 60000
+        step = self.chunk_size * 60000
+        semaphore = asyncio.Semaphore(self.pool_size)
+
+        async def read_window(symbol, window_start, window_end):
+            parts = []
+            async with semaphore:
+                async for chunk in self.read(symbol, window_start, window_end, columns):
+                    parts.append(chunk)
+            return parts
+
+        for window_ms in range(start_ms, end_ms, step):
+            window_end_ms = min(window_ms + step, end_ms)
+            length = (window_end_ms - window_ms) // 60000
+            window_start = ms_to_datetime(window_ms)
+            window_end = ms_to_datetime(window_end_ms)
+
+            results = await asyncio.gather(*(read_window(symbol, window_start, window_end) for symbol in symbols))
+
+            chunk = {'timestamp': np.arange(window_ms, window_end_ms, 60000, dtype='int64').view('datetime64[ms]')}
+            for symbol, parts in zip(symbols, results):
+                grid = {column: np.full(length, np.nan) for column in columns}
+                for part in parts:
+                    index = (part['timestamp'].astype('int64') - window_ms) // 60000
+                    for column in columns:
+                        grid[column][index] = part[column]
+                for column in columns:
+                    chunk[f"{symbol}.{column}"] = grid[column]
+            yield _to_arrow(chunk) if arrow else chunk
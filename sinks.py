@@ -0,0 +1,718 @@
+"""Хранилища свечей для DownloadEngine.
+
+Движок скачивает свечи и передает их хранилищу (sink) в формате REST API
+биржи: списки [start_ms, open, high, low, close, volume, turnover]. Хранилище
+само ищет пропуски и последнюю сохраненную свечу тикера.
+
+    postgres - таблицы <schema>.klines_<symbol> (по умолчанию);
+    parquet  - набор файлов <dir>/symbol=<SYMBOL>/month=<YYYY-MM>/part-*.parquet,
+               читается через pyarrow.dataset.dataset(dir, partitioning='hive');
+    mmap     - плотные memory-mapped файлы на тикер (minutestore.py).
+
+Несколько хранилищ через запятую ("postgres,mmap") пишутся одновременно,
+пропуски и последние свечи берутся у первого.
+"""
+import itertools
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from metrics import POOL_WAIT
+from minutestore import MinuteStore, STORE_DIR
+from timeutil import UTC, utc, utc_now, ms_to_datetime, datetime_to_ms, split_by_month
+from tracing import span
+
+SINKS = ('postgres', 'parquet', 'mmap')
+WATERMARK_BATCH = 200  # таблиц в одном запросе max(timestamp)
+STATEMENT_CACHE_SIZE = 1024  # подготовленных запросов на соединение (upsert и поиск пропусков на тикер)
+PARQUET_DIR = "data"
+ROW_GROUP_SIZE = 50_000  # строк в группе строк Parquet (месяц минутных свечей - 44640)
+MAX_OPEN_FILES = 64  # одновременно открытых файлов партиций
+COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'turnover')
+MINUTE_MS = 60000
+_PART_SEQUENCE = itertools.count()  # номер файла партиции в процессе, упорядочивает имена внутри микросекунды
+
+# Таблицы со старой колонкой времени без часового пояса (до перехода на UTC)
+LEGACY_TABLES_QUERY = (
+    "SELECT table_name FROM information_schema.columns "
+    "WHERE table_schema = $1 AND table_name LIKE 'klines\\_%' "
+    "AND column_name = 'timestamp' AND data_type = 'timestamp without time zone' "
+    "ORDER BY table_name"
+)
+
+
+def table_name(symbol):
+    return f"klines_{symbol.lower()}"
+
+
+def upsert_clause(table):
+    """ON CONFLICT для вставки в klines_*: строка обновляется, только если значения изменились"""
+    return f"""
+        ON CONFLICT (timestamp) DO UPDATE SET
+            open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+            close = EXCLUDED.close, volume = EXCLUDED.volume, turnover = EXCLUDED.turnover
+        WHERE ({table}.open, {table}.high, {table}.low, {table}.close,
+               {table}.volume, {table}.turnover)
+            IS DISTINCT FROM (EXCLUDED.open, EXCLUDED.high, EXCLUDED.low, EXCLUDED.close,
+                              EXCLUDED.volume, EXCLUDED.turnover)
+    """
+
+
+def kline_row(kline):
+    """Свеча REST API -> (epoch ms, open, high, low, close, volume, turnover)"""
+    return (int(kline[0]), float(kline[1]), float(kline[2]), float(kline[3]),
+            float(kline[4]), float(kline[5]), float(kline[6]))
+
+
+class KlineSink:
+    """Интерфейс хранилища. open() и close() обрамляют каждый прогон движка"""
+
+    row_bytes = 0  # примерный объем одной свечи на диске для оценки плана
+
+    async def open(self, max_connections):
+        pass
+
+    async def close(self):
+        pass
+
+    async def ensure_table(self, symbol):
+        """Готовит место под свечи тикера до первой записи"""
+        pass
+
+    async def bootstrap(self, symbols, create=True):
+        """Подготовка перед прогоном по всем тикерам сразу. create=False - только проверить, что есть"""
+        if create:
+            for symbol in symbols:
+                await self.ensure_table(symbol)
+
+    async def missing_periods(self, symbol, start_date, end_date):
+        """Отрезки [start, end] внутри периода, для которых нет минутных свечей"""
+        raise NotImplementedError
+
+    async def watermarks(self, symbols):
+        """{тикер: время последней сохраненной свечи} для тикеров с данными"""
+        raise NotImplementedError
+
+    async def write(self, symbol, klines):
+        """Сохраняет свечи. Повторная запись той же минуты заменяет свечу"""
+        raise NotImplementedError
+
+    async def write_arrays(self, symbol, timestamps, values):
+        """Массовая запись из numpy: timestamps - epoch ms, values - строки
+        (open, high, low, close, volume, turnover). По умолчанию - через write()"""
+        await self.write(symbol, [[ts] + row for ts, row in zip(timestamps.tolist(), values.tolist())])
+
+    async def aggregates(self, symbol, start_date, end_date, bucket_minutes):
+        """Сводка минутных свечей периода по интервалам bucket_minutes (для verify.py).
+
+        {начало интервала, epoch ms: {'high', 'low', 'volume', 'turnover', 'minutes'}}
+        для интервалов, в которых есть свечи.
+        """
+        raise NotImplementedError(f"Хранилище {type(self).__name__} не поддерживает сверку")
+
+
+class PostgresSink(KlineSink):
+    """Таблица klines_<symbol> на тикер в схеме из настроек"""
+
+    row_bytes = 130  # строка кучи с шестью DECIMAL и запись первичного ключа
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.schema = settings.get('schema', 'bybit_data')
+        self.pool = None
+        # Реестр каталога на время прогона: {таблица: существует ли} и тексты запросов
+        # по таблицам. Одинаковый текст asyncpg готовит на соединении один раз
+        self.tables = {}
+        self.statements = {}
+
+    @asynccontextmanager
+    async def acquire(self):
+        """pool.acquire() с учетом времени ожидания соединения"""
+        started = time.perf_counter()
+        with span('pool_wait'):
+            conn = await self.pool.acquire()
+        POOL_WAIT.observe(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+
+    async def open(self, max_connections):
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(
+            host=self.settings.get('host'),
+            port=self.settings.get('port', '5432'),
+            user=self.settings.get('user'),
+            password=self.settings.get('password'),
+            database=self.settings.get('database'),
+            min_size=1,
+            max_size=max_connections,
+            statement_cache_size=STATEMENT_CACHE_SIZE
+        )
+        # Таблицы могли создать или удалить между прогонами
+        self.tables.clear()
+        async with self.acquire() as conn:
+            legacy = await conn.fetch(LEGACY_TABLES_QUERY, self.schema)
+        if legacy:
+            await self.close()
+            raise RuntimeError(
+                f"В схеме {self.schema} {len(legacy)} таблиц klines_* хранят местное время без часового "
+                f"пояса. Переведите их на UTC: python migrate_utc.py --source-tz <пояс загрузчика>"
+            )
+
+    async def close(self):
+        pool, self.pool = self.pool, None
+        if pool is not None:
+            await pool.close()
+
+    def create_table_query(self, table):
+        return f"""
+            CREATE TABLE IF NOT EXISTS {self.schema}.{table} (
+                timestamp TIMESTAMPTZ PRIMARY KEY,
+                open DECIMAL,
+                high DECIMAL,
+                low DECIMAL,
+                close DECIMAL,
+                volume DECIMAL,
+                turnover DECIMAL
+            )"""
+
+    def statement(self, kind, table):
+        """Текст запроса kind ('upsert', 'gaps', 'aggregates') для таблицы, собирается один раз"""
+        key = (kind, table)
+        query = self.statements.get(key)
+        if query is None:
+            if kind == 'upsert':
+                query = f"""
+                INSERT INTO {self.schema}.{table}
+                (timestamp, open, high, low, close, volume, turnover)
+                VALUES ($1, $2, $3, $4, $5, $6, $7)
+                {upsert_clause(table)}
+                """
+            elif kind == 'aggregates':
+                # Интервалы от начала эпохи, как у свечей биржи ($3 - длина в секундах)
+                query = f"""
+                SELECT (floor(extract(epoch FROM timestamp) / $3::int) * $3::int)::bigint * 1000 AS bucket,
+                       max(high) AS high, min(low) AS low,
+                       sum(volume) AS volume, sum(turnover) AS turnover, count(*) AS minutes
+                FROM {self.schema}.{table}
+                WHERE timestamp BETWEEN $1 AND $2
+                GROUP BY 1
+                ORDER BY 1
+                """
+            else:
+                query = f"""
+                        WITH time_range AS (
+                            SELECT generate_series(
+                                $1::timestamptz,
+                                $2::timestamptz,
+                                interval '1 minute'
+                            ) AS time_point
+                        ),
+                        existing_data AS (
+                            SELECT timestamp FROM {self.schema}.{table}
+                            WHERE timestamp BETWEEN $1 AND $2
+                        )
+                        SELECT time_point FROM time_range
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM existing_data
+                            WHERE timestamp = time_point
+                        )
+                        ORDER BY time_point
+                        """
+            self.statements[key] = query
+        return query
+
+    async def bootstrap(self, symbols, create=True):
+        """Один запрос к каталогу на все тикеры, недостающие таблицы - одной транзакцией.
+
+        Результат остается в реестре self.tables до следующего open(), поэтому
+        ensure_table, missing_periods и watermarks в ходе прогона каталог не трогают.
+        """
+        wanted = list(dict.fromkeys(table_name(symbol) for symbol in symbols))
+        unknown = [table for table in wanted if table not in self.tables]
+        missing = [table for table in wanted if not self.tables.get(table, False)] if create else []
+        if not unknown and not missing:
+            return
+
+        async with self.acquire() as conn:
+            if unknown:
+                with span('catalog', tables=len(unknown)):
+                    rows = await conn.fetch(
+                        "SELECT table_name FROM information_schema.tables "
+                        "WHERE table_schema = $1 AND table_name = ANY($2::text[])",
+                        self.schema, unknown
+                    )
+                existing = {row['table_name'] for row in rows}
+                for table in unknown:
+                    self.tables[table] = table in existing
+
+            missing = [table for table in missing if not self.tables[table]]
+            if missing:
+                with span('create_tables', tables=len(missing)):
+                    async with conn.transaction():
+                        # Схема создается вместе с первыми таблицами: план (create=False) базу не меняет
+                        await conn.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema}")
+                        await conn.execute(";".join(self.create_table_query(table) for table in missing))
+                for table in missing:
+                    self.tables[table] = True
+                logging.info(f"Создано таблиц в схеме {self.schema}: {len(missing)}")
+
+    async def ensure_table(self, symbol):
+        if not self.tables.get(table_name(symbol)):
+            await self.bootstrap([symbol])
+
+    async def missing_periods(self, symbol, start_date, end_date):
+        table = table_name(symbol)
+        start_date, end_date = utc(start_date), utc(end_date)
+        missing_periods = []
+
+        if table not in self.tables:
+            await self.bootstrap([symbol], create=False)
+        if not self.tables[table]:
+            return split_by_month(start_date, end_date)
+
+        gap_query = self.statement('gaps', table)
+        async with self.acquire() as conn:
+            current_month_start = datetime(start_date.year, start_date.month, 1, tzinfo=UTC)
+            while current_month_start < end_date:
+                next_month = datetime(current_month_start.year, current_month_start.month, 1, tzinfo=UTC) + timedelta(days=32)
+                month_end = min(datetime(next_month.year, next_month.month, 1, tzinfo=UTC) - timedelta(seconds=1), end_date)
+
+                month_start = max(current_month_start, start_date)
+                month_end = min(month_end, end_date)
+
+                with span('gap_query', symbol=symbol, month=month_start.strftime('%Y-%m')):
+                    gaps = await conn.fetch(gap_query, month_start, month_end)
+
+                if gaps:
+                    current_start = gaps[0]['time_point']
+                    prev_time = current_start
+
+                    for gap in gaps[1:]:
+                        if (gap['time_point'] - prev_time) > timedelta(minutes=1):
+                            missing_periods.append((current_start, prev_time))
+                            current_start = gap['time_point']
+                        prev_time = gap['time_point']
+
+                    missing_periods.append((current_start, prev_time))
+
+                current_month_start = month_end + timedelta(seconds=1)
+
+        return missing_periods
+
+    async def watermarks(self, symbols):
+        """max(timestamp) по всем существующим таблицам, таблицы берутся из реестра каталога"""
+        schema = self.schema
+        tables = {table_name(symbol): symbol for symbol in symbols}
+        watermarks = {}
+
+        await self.bootstrap(symbols, create=False)
+        existing = [table for table in tables if self.tables[table]]
+        async with self.acquire() as conn:
+            # max() по первичному ключу - это один обратный проход по индексу
+            for i in range(0, len(existing), WATERMARK_BATCH):
+                batch = existing[i:i + WATERMARK_BATCH]
+                query = " UNION ALL ".join(
+                    f"SELECT '{table}' AS table_name, (SELECT max(timestamp) FROM {schema}.{table}) AS watermark"
+                    for table in batch
+                )
+                for row in await conn.fetch(query):
+                    if row['watermark'] is not None:
+                        watermarks[tables[row['table_name']]] = row['watermark']
+
+        return watermarks
+
+    async def write(self, symbol, klines):
+        table = table_name(symbol)
+        with span('convert_rows', rows=len(klines)):
+            values = []
+            for kline in reversed(klines):
+                row = kline_row(kline)
+                values.append((ms_to_datetime(row[0]),) + row[1:])
+
+        query = self.statement('upsert', table)
+        async with self.acquire() as conn:
+            await conn.executemany(query, values)
+
+    async def aggregates(self, symbol, start_date, end_date, bucket_minutes):
+        """Одним сгруппированным запросом на стороне сервера"""
+        table = table_name(symbol)
+        if table not in self.tables:
+            await self.bootstrap([symbol], create=False)
+        if not self.tables[table]:
+            return {}
+
+        async with self.acquire() as conn:
+            with span('aggregate_query', symbol=symbol):
+                rows = await conn.fetch(self.statement('aggregates', table),
+                                        utc(start_date), utc(end_date), bucket_minutes * 60)
+        return {
+            row['bucket']: {
+                'high': float(row['high']), 'low': float(row['low']),
+                'volume': float(row['volume']), 'turnover': float(row['turnover']),
+                'minutes': row['minutes'],
+            }
+            for row in rows
+        }
+
+    async def write_arrays(self, symbol, timestamps, values):
+        records = [(ms_to_datetime(ts),) + tuple(row) for ts, row in zip(timestamps.tolist(), values.tolist())]
+        await self.bulk_write(symbol, records)
+
+    async def bulk_write(self, symbol, records):
+        """Массовая запись через COPY во временную таблицу.
+
+        records - кортежи (timestamp, open, high, low, close, volume, turnover).
+        """
+        table = table_name(symbol)
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(f"CREATE TEMP TABLE klines_bulk (LIKE {self.schema}.{table}) ON COMMIT DROP")
+                await conn.copy_records_to_table('klines_bulk', records=records)
+                await conn.execute(f"""
+                    INSERT INTO {self.schema}.{table} SELECT * FROM klines_bulk
+                    {upsert_clause(table)}
+                """)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Для хранилища parquet установите pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def _kline_schema():
+    pa = _pyarrow()
+    return pa.schema([('timestamp', pa.timestamp('ms', tz='UTC'))] + [(column, pa.float64()) for column in COLUMNS])
+
+
+def _runs(timestamps):
+    """Отсортированные минуты без повторов -> непрерывные отрезки [(min_ms, max_ms)]"""
+    runs = []
+    for ts in timestamps:
+        if runs and ts == runs[-1][1] + MINUTE_MS:
+            runs[-1][1] = ts
+        else:
+            runs.append([ts, ts])
+    return [tuple(run) for run in runs]
+
+
+class _PartitionWriter:
+    """Открытый файл партиции: буфер строк и ParquetWriter во временный файл"""
+
+    def __init__(self, directory, compression):
+        # Порядок имен - порядок записи (при чтении повторы минут берутся из последнего файла):
+        # время UTC до микросекунд, затем номер в процессе; uuid только для уникальности
+        name = (f"part-{utc_now().strftime('%Y%m%d%H%M%S%f')}-{next(_PART_SEQUENCE):08d}-"
+                f"{uuid.uuid4().hex[:8]}.parquet")
+        self.path = os.path.join(directory, name)
+        # Файлы с точкой в начале имени pyarrow.dataset и поиск пропусков пропускают
+        self.tmp_path = os.path.join(directory, f".{name}.tmp")
+        self.compression = compression
+        self.writer = None
+        self.rows = {}
+
+    def add(self, rows):
+        for row in rows:
+            self.rows[row[0]] = row
+
+    def flush(self):
+        """Пишет буфер одной группой строк, отсортированной по времени"""
+        if not self.rows:
+            return
+        pa = _pyarrow()
+        schema = _kline_schema()
+        keys = sorted(self.rows)
+        arrays = [pa.array(keys, type=schema.field('timestamp').type)]
+        for i in range(1, len(COLUMNS) + 1):
+            arrays.append(pa.array([self.rows[key][i] for key in keys], type=pa.float64()))
+        table = pa.Table.from_arrays(arrays, schema=schema)
+
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.tmp_path), exist_ok=True)
+            self.writer = pa.parquet.ParquetWriter(self.tmp_path, schema, compression=self.compression)
+        self.writer.write_table(table, row_group_size=len(keys))
+        self.rows = {}
+
+    def finalize(self):
+        """Дописывает буфер, закрывает файл и атомарно делает его видимым"""
+        self.flush()
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        with open(self.tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(self.tmp_path, self.path)
+
+
+class ParquetSink(KlineSink):
+    """Набор Parquet файлов с партициями по тикеру и месяцу.
+
+    Строки копятся в буфере партиции и пишутся группами по row_group_size во
+    временный файл, который переименовывается в part-*.parquet только при
+    закрытии, поэтому читатели никогда не видят недописанный файл. Файлы
+    только добавляются: повторно скачанные минуты (окно пересмотра --sync)
+    могут встречаться в нескольких файлах, при чтении оставляйте последнюю
+    по имени файла. Пропуски ищутся по min/max статистике колонки timestamp
+    в группах строк, колонка читается только у групп с дырами внутри.
+    """
+
+    row_bytes = 35  # float64 колонки после zstd
+
+    def __init__(self, root=PARQUET_DIR, row_group_size=ROW_GROUP_SIZE,
+                 max_open_files=MAX_OPEN_FILES, compression='zstd'):
+        self.root = root
+        self.row_group_size = row_group_size
+        self.max_open_files = max_open_files
+        self.compression = compression
+        self.writers = OrderedDict()
+        self.file_stats = {}
+
+    def symbol_dir(self, symbol):
+        return os.path.join(self.root, f"symbol={symbol}")
+
+    async def open(self, max_connections):
+        _pyarrow()
+        os.makedirs(self.root, exist_ok=True)
+
+    async def close(self):
+        while self.writers:
+            (symbol, month), writer = self.writers.popitem(last=False)
+            try:
+                writer.finalize()
+            except Exception as e:
+                logging.error(f"Ошибка записи файла {symbol} {month}: {str(e)}")
+
+    def partition_writer(self, symbol, month):
+        key = (symbol, month)
+        writer = self.writers.get(key)
+        if writer is not None:
+            self.writers.move_to_end(key)
+            return writer
+        if len(self.writers) >= self.max_open_files:
+            _, oldest = self.writers.popitem(last=False)
+            oldest.finalize()
+        writer = _PartitionWriter(os.path.join(self.symbol_dir(symbol), f"month={month}"), self.compression)
+        self.writers[key] = writer
+        return writer
+
+    async def write(self, symbol, klines):
+        with span('convert_rows', rows=len(klines)):
+            months = {}
+            for kline in klines:
+                row = kline_row(kline)
+                months.setdefault(ms_to_datetime(row[0]).strftime('%Y-%m'), []).append(row)
+
+        for month, rows in months.items():
+            writer = self.partition_writer(symbol, month)
+            writer.add(rows)
+            if len(writer.rows) >= self.row_group_size:
+                with span('write_row_group', symbol=symbol, month=month, rows=len(writer.rows)):
+                    writer.flush()
+
+    def partition_files(self, symbol, first_month=None, last_month=None):
+        """Готовые файлы тикера по возрастанию месяца или None, если данных нет"""
+        base = self.symbol_dir(symbol)
+        if not os.path.isdir(base):
+            return None
+        paths = []
+        for entry in sorted(os.listdir(base)):
+            month = entry[len('month='):]
+            if not entry.startswith('month=') or (first_month and month < first_month) \
+                    or (last_month and month > last_month):
+                continue
+            directory = os.path.join(base, entry)
+            paths += [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                      if name.endswith('.parquet') and not name.startswith(('.', '_'))]
+        return paths
+
+    def file_intervals(self, path):
+        """Непрерывные отрезки минут файла [(min_ms, max_ms)], кэшируются до изменения файла"""
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self.file_stats.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        pa = _pyarrow()
+        parquet_file = pa.parquet.ParquetFile(path)
+        metadata = parquet_file.metadata
+        column = parquet_file.schema_arrow.get_field_index('timestamp')
+        intervals = []
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            stats = row_group.column(column).statistics
+            if stats is not None and stats.has_min_max:
+                low, high = stats.min_raw, stats.max_raw
+                # Минуты в группе не повторяются, поэтому совпадение длины значит отсутствие дыр
+                if (high - low) // MINUTE_MS + 1 == row_group.num_rows:
+                    intervals.append((low, high))
+                    continue
+            timestamps = parquet_file.read_row_group(i, columns=['timestamp']).column(0)
+            intervals += _runs(sorted(set(timestamps.cast(pa.int64()).to_pylist())))
+
+        self.file_stats[path] = (key, intervals)
+        return intervals
+
+    async def missing_periods(self, symbol, start_date, end_date):
+        start_date, end_date = utc(start_date), utc(end_date)
+        paths = self.partition_files(symbol, start_date.strftime('%Y-%m'), end_date.strftime('%Y-%m'))
+        if paths is None:
+            return split_by_month(start_date, end_date)
+
+        start_ms = -(-datetime_to_ms(start_date) // MINUTE_MS) * MINUTE_MS
+        end_ms = datetime_to_ms(end_date) // MINUTE_MS * MINUTE_MS
+        gaps = []
+        with span('gap_scan', symbol=symbol, files=len(paths)):
+            covered = sorted(interval for path in paths for interval in self.file_intervals(path))
+            cursor = start_ms
+            for low, high in covered:
+                if low > end_ms:
+                    break
+                if high < cursor:
+                    continue
+                if low > cursor:
+                    gaps.append((cursor, low - MINUTE_MS))
+                cursor = high + MINUTE_MS
+            if cursor <= end_ms:
+                gaps.append((cursor, end_ms))
+
+        return [(ms_to_datetime(low), ms_to_datetime(high)) for low, high in gaps]
+
+    async def watermarks(self, symbols):
+        """Последняя свеча по статистике файлов самого позднего месяца с данными"""
+        watermarks = {}
+        for symbol in symbols:
+            newest = newest_month = None
+            for path in reversed(self.partition_files(symbol) or []):
+                month = os.path.dirname(path)
+                if newest is not None and month != newest_month:
+                    break
+                high = max((high for _, high in self.file_intervals(path)), default=None)
+                if high is not None and (newest is None or high > newest):
+                    newest, newest_month = high, month
+            if newest is not None:
+                watermarks[symbol] = ms_to_datetime(newest)
+        return watermarks
+
+
+class MmapSink(KlineSink):
+    """Плотные memory-mapped файлы на тикер: пропуски - просмотр битовой карты наличия"""
+
+    row_bytes = 49  # запись 6 x float64 и бит карты
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.stores = {}
+
+    def store(self, symbol):
+        store = self.stores.get(symbol)
+        if store is None:
+            store = self.stores[symbol] = MinuteStore(self.root, symbol)
+        return store
+
+    async def open(self, max_connections):
+        os.makedirs(self.root, exist_ok=True)
+
+    async def close(self):
+        for store in self.stores.values():
+            store.close()
+        self.stores = {}
+
+    async def missing_periods(self, symbol, start_date, end_date):
+        store = self.store(symbol)
+        if store.base_ms is None:
+            return split_by_month(start_date, end_date)
+        with span('gap_scan', symbol=symbol):
+            gaps = store.missing(datetime_to_ms(start_date), datetime_to_ms(end_date))
+        return [(ms_to_datetime(low), ms_to_datetime(high)) for low, high in gaps]
+
+    async def watermarks(self, symbols):
+        watermarks = {}
+        for symbol in symbols:
+            last = self.store(symbol).last_ms()
+            if last is not None:
+                watermarks[symbol] = ms_to_datetime(last)
+        return watermarks
+
+    async def write(self, symbol, klines):
+        with span('convert_rows', rows=len(klines)):
+            self.store(symbol).write_klines(klines)
+
+    async def write_arrays(self, symbol, timestamps, values):
+        self.store(symbol).write(timestamps, values)
+
+    async def aggregates(self, symbol, start_date, end_date, bucket_minutes):
+        with span('aggregate_scan', symbol=symbol):
+            return self.store(symbol).aggregate(datetime_to_ms(start_date), datetime_to_ms(end_date),
+                                                bucket_minutes)
+
+
+class TeeSink(KlineSink):
+    """Пишет во все хранилища, пропуски и последние свечи берет у первого"""
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        self.row_bytes = sum(sink.row_bytes for sink in self.sinks)
+
+    async def open(self, max_connections):
+        for sink in self.sinks:
+            await sink.open(max_connections)
+
+    async def close(self):
+        for sink in self.sinks:
+            try:
+                await sink.close()
+            except Exception as e:
+                logging.error(f"Ошибка закрытия хранилища {type(sink).__name__}: {str(e)}")
+
+    async def ensure_table(self, symbol):
+        for sink in self.sinks:
+            await sink.ensure_table(symbol)
+
+    async def bootstrap(self, symbols, create=True):
+        for sink in self.sinks:
+            await sink.bootstrap(symbols, create)
+
+    async def missing_periods(self, symbol, start_date, end_date):
+        return await self.sinks[0].missing_periods(symbol, start_date, end_date)
+
+    async def watermarks(self, symbols):
+        return await self.sinks[0].watermarks(symbols)
+
+    async def aggregates(self, symbol, start_date, end_date, bucket_minutes):
+        return await self.sinks[0].aggregates(symbol, start_date, end_date, bucket_minutes)
+
+    async def write(self, symbol, klines):
+        for sink in self.sinks:
+            await sink.write(symbol, klines)
+
+    async def write_arrays(self, symbol, timestamps, values):
+        for sink in self.sinks:
+            await sink.write_arrays(symbol, timestamps, values)
+
+
+def make_sink(settings):
+    """Хранилище по настройке sink: postgres (по умолчанию), parquet, mmap или несколько через запятую"""
+    sinks = []
+    for kind in (settings.get('sink') or 'postgres').split(','):
+        kind = kind.strip()
+        if kind == 'postgres':
+            sinks.append(PostgresSink(settings))
+        elif kind == 'parquet':
+            sinks.append(ParquetSink(settings.get('parquet_dir') or PARQUET_DIR))
+        elif kind == 'mmap':
+            sinks.append(MmapSink(settings.get('mmap_dir') or STORE_DIR))
+        else:
+            raise ValueError(f"Неизвестное хранилище: {kind}")
+    return sinks[0] if len(sinks) == 1 else TeeSink(sinks)
@@ -0,0 +1,59 @@
+import json
+import os
+import time
+import logging
+
+TICKERS_URL = "https://api.bybit.com/v5/market/tickers"
+CACHE_FILE = "tickers_cache.json"
+CACHE_TTL = 3600  # секунды
+FETCH_TIMEOUT = 15  # секунды
+
+
+def load_cached_tickers(path=CACHE_FILE, ttl=CACHE_TTL):
+    """Возвращает (список тикеров, признак свежести) из локального кэша"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            cache = json.load(f)
+        tickers = cache['tickers']
+        if not isinstance(tickers, list):
+            return [], False
+        fresh = time.time() - float(cache.get('saved_at', 0)) < ttl
+        return tickers, fresh
+    except FileNotFoundError:
+        return [], False
+    except Exception as e:
+        logging.error(f"Ошибка чтения кэша тикеров: {str(e)}")
+        return [], False
+
+
+def save_cached_tickers(tickers, path=CACHE_FILE):
+    """Атомарно сохраняет список тикеров в локальный кэш"""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'saved_at': time.time(), 'tickers': tickers}, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.error(f"Ошибка записи кэша тикеров: {str(e)}")
+
+
+async def fetch_tickers(url=TICKERS_URL, timeout=FETCH_TIMEOUT):
+    """Запрашивает список спотовых тикеров с биржи"""
+    import aiohttp
+
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(timeout=client_timeout) as session:
+        async with session.get(url, params={'category': 'spot'}) as response:
+            data = await response.json()
+
+            if not isinstance(data, dict):
+                raise ValueError("Invalid API response format")
+
+            if data.get('retCode') != 0:
+                ret_msg = data.get('retMsg', 'Unknown error')
+                raise ValueError(f"API error: {ret_msg}")
+
+            if not isinstance(data.get('result', {}).get('list'), list):
+                raise ValueError("Invalid tickers data format")
+
+            return data['result']['list']
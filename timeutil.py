@@ -0,0 +1,52 @@
+"""Время в загрузчике - только UTC.
+
+Биржа отдает время свечей в epoch ms, в Postgres оно хранится как
+TIMESTAMPTZ, внутри программы - datetime с tzinfo=UTC. Время без часового
+пояса (ввод пользователя, аргументы командной строки) считается UTC.
+"""
+from datetime import datetime, timedelta, timezone
+
+UTC = timezone.utc
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def utc(dt):
+    """Приводит datetime к UTC. Время без часового пояса считается UTC"""
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=UTC)
+    return dt.astimezone(UTC)
+
+
+def utc_now():
+    return datetime.now(UTC)
+
+
+def ms_to_datetime(ms):
+    """Переводит время биржи (epoch ms) в datetime UTC"""
+    return EPOCH + timedelta(milliseconds=int(ms))
+
+
+def datetime_to_ms(dt):
+    """Переводит datetime во время биржи (epoch ms)"""
+    return (utc(dt) - EPOCH) // timedelta(milliseconds=1)
+
+
+def ceil_minute(dt):
+    """Округляет время вверх до начала минуты"""
+    return ms_to_datetime(-(-datetime_to_ms(dt) // 60000) * 60000)
+
+
+def split_by_month(start_date, end_date):
+    """Делит период больше 30 дней на календарные месяцы UTC"""
+    start_date, end_date = utc(start_date), utc(end_date)
+    if (end_date - start_date) <= timedelta(days=30):
+        return [(start_date, end_date)]
+
+    periods = []
+    current_start = start_date
+    while current_start < end_date:
+        next_month = datetime(current_start.year, current_start.month, 1, tzinfo=UTC) + timedelta(days=32)
+        month_end = min(datetime(next_month.year, next_month.month, 1, tzinfo=UTC) - timedelta(seconds=1), end_date)
+        periods.append((current_start, month_end))
+        current_start = month_end + timedelta(seconds=1)
+    return periods
@@ -0,0 +1,112 @@
+"""Трассировка этапов загрузки и профилирование прогонов.
+
+Спаны пишутся в формате Chrome trace (JSON), файл открывается в
+chrome://tracing или https://ui.perfetto.dev. Каждая asyncio задача
+выводится отдельной дорожкой, чтобы параллельные загрузки не смешивались.
+Пока трассировка не включена, span() ничего не записывает.
+"""
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+TRACE_DIR = "traces"
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.tracks = {}
+        self.origin = time.perf_counter()
+
+    def start(self):
+        self.events = []
+        self.tracks = {}
+        self.origin = time.perf_counter()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+
+    def _track(self):
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = task if task is not None else threading.current_thread()
+        track = self.tracks.get(key)
+        if track is None:
+            track = self.tracks[key] = len(self.tracks) + 1
+            name = task.get_name() if task is not None else key.name
+            self.events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                                'tid': track, 'args': {'name': name}})
+        return track
+
+    def _now_us(self):
+        return (time.perf_counter() - self.origin) * 1e6
+
+    @contextmanager
+    def _span(self, name, args):
+        track = self._track()
+        started = self._now_us()
+        try:
+            yield
+        finally:
+            self.events.append({
+                'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': track,
+                'ts': started, 'dur': self._now_us() - started, 'args': args
+            })
+
+    def span(self, name, **args):
+        """Контекстный менеджер вокруг этапа. Аргументы попадают в args события"""
+        if not self.enabled:
+            return nullcontext()
+        return self._span(name, args)
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+TRACER = Tracer()
+span = TRACER.span
+
+
+async def record_run(coro, trace_dir=None, profile=False, name='run'):
+    """Выполняет корутину с трассировкой и, по желанию, под cProfile.
+
+    Результаты пишутся в trace_dir как <name>-<время>.json (Chrome trace),
+    .prof (pstats) и .txt (топ функций по суммарному времени).
+    """
+    if not trace_dir and not profile:
+        return await coro
+
+    trace_dir = trace_dir or TRACE_DIR
+    os.makedirs(trace_dir, exist_ok=True)
+    base = os.path.join(trace_dir, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+
+    profiler = cProfile.Profile() if profile else None
+    TRACER.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        return await coro
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(f"{base}.prof")
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+            with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+                f.write(summary.getvalue())
+        TRACER.stop()
+        TRACER.dump(f"{base}.json")
+        logging.info(f"Трассировка прогона сохранена в {base}.json")
@@ -0,0 +1,140 @@
+"""Сверка сохраненных свечей с дневными (или часовыми) свечами биржи.
+
+Чтобы проверить историю, не скачивая ее заново, у биржи берутся свечи
+interval=D (или 60) - один запрос на 1000 дней, - а у хранилища сводка
+минутных свечей по тем же интервалам (у Postgres - один сгруппированный
+запрос на тикер). Сравниваются max(high), min(low), суммы volume и
+turnover, а внутри сохраненной истории - и число минут: пропавшие минуты
+без сделок не меняют ни цены, ни объема. Несовпавшие дни ставятся на повторную загрузку через
+DownloadEngine.run_job() или сохраняются как задание:
+
+    python ByBitDownloader.py --headless --verify --from 2023-01-01
+    python ByBitDownloader.py --headless --verify --verify-interval 60 --plan --save-job fix.json
+"""
+import asyncio
+import logging
+from datetime import timedelta
+
+from tracing import span
+from timeutil import utc, utc_now, ms_to_datetime, datetime_to_ms
+
+VERIFY_INTERVALS = {'D': 1440, '60': 60}  # минут в свече сверки
+VERIFY_TOLERANCE = 1e-6  # допустимое относительное расхождение (биржа округляет суммы)
+MINUTE_MS = 60000
+
+
+def closed_buckets(start_date, end_date, bucket_minutes):
+    """(first_ms, last_ms) начал интервалов, целиком лежащих в [start_date, end_date] и уже закрытых"""
+    step = bucket_minutes * MINUTE_MS
+    first = -(-datetime_to_ms(start_date) // step) * step
+    last = (min(datetime_to_ms(end_date), datetime_to_ms(utc_now())) + MINUTE_MS) // step * step - step
+    return first, last
+
+
+def differs(ours, theirs):
+    return abs(ours - theirs) > VERIFY_TOLERANCE * max(abs(ours), abs(theirs), 1e-12)
+
+
+def compare(stored, kline, minutes=None):
+    """Список расхождений сводки хранилища со свечой биржи [start, open, high, low, close, volume, turnover].
+    minutes - сколько минутных свечей должно быть в интервале (None - не проверять)"""
+    if stored is None:
+        return ["нет данных"] if float(kline[5]) else []
+    problems = []
+    for name, index in (('high', 2), ('low', 3), ('volume', 5), ('turnover', 6)):
+        theirs = float(kline[index])
+        if differs(stored[name], theirs):
+            problems.append(f"{name} {stored[name]:g} / {theirs:g}")
+    if minutes is not None and stored['minutes'] < minutes:
+        problems.append(f"minutes {stored['minutes']} / {minutes}")
+    return problems
+
+
+async def exchange_buckets(engine, session, symbol, first_ms, last_ms, interval):
+    """{начало интервала, ms: свеча биржи} за [first_ms, last_ms] окнами по kline_limit свечей"""
+    step = VERIFY_INTERVALS[interval] * MINUTE_MS
+    klines = {}
+    current = first_ms
+    while current <= last_ms and not engine.shutdown:
+        window_end = min(current + (engine.kline_limit - 1) * step, last_ms)
+        chunk = await engine.fetch_klines(session, symbol, start_time=ms_to_datetime(current),
+                                          end_time=ms_to_datetime(window_end), interval=interval)
+        if chunk is None:
+            raise RuntimeError(f"Биржа не отдала свечи interval={interval} для {symbol}")
+        for kline in chunk:
+            if first_ms <= int(kline[0]) <= last_ms:
+                klines[int(kline[0])] = kline
+        current = window_end + step
+    return klines
+
+
+async def verify_symbol(engine, session, symbol, start_date, end_date, interval):
+    """[(начало интервала, конец интервала, [расхождения])] по тикеру"""
+    bucket_minutes = VERIFY_INTERVALS[interval]
+    first, last = closed_buckets(start_date, end_date, bucket_minutes)
+    if first > last:
+        return []
+
+    with span('verify', symbol=symbol):
+        klines = await exchange_buckets(engine, session, symbol, first, last, interval)
+        stored = await engine.sink.aggregates(symbol, ms_to_datetime(first),
+                                              ms_to_datetime(last + (bucket_minutes - 1) * MINUTE_MS),
+                                              bucket_minutes)
+
+    # Крайние интервалы сохраненной истории могут быть неполными (день листинга,
+    # граница загрузки), остальные должны содержать все минуты
+    first_stored, last_stored = (min(stored), max(stored)) if stored else (None, None)
+    mismatches = []
+    for start_ms, kline in sorted(klines.items()):
+        full = bool(stored) and first_stored < start_ms < last_stored
+        problems = compare(stored.get(start_ms), kline, bucket_minutes if full else None)
+        if problems:
+            bucket_start = ms_to_datetime(start_ms)
+            mismatches.append((bucket_start, bucket_start + timedelta(minutes=bucket_minutes - 1), problems))
+    return mismatches
+
+
+async def verify(engine, selected_tickers, start_date, end_date, interval='D'):
+    """Сверяет тикеры. {тикер: [(start, end, [расхождения])]} для тикеров, которые удалось сверить"""
+    start_date, end_date = utc(start_date), utc(end_date)
+    engine.shutdown = False
+    semaphore = asyncio.Semaphore(engine.download_threads)
+    results = {}
+
+    async def run_symbol(session, symbol):
+        async with semaphore:
+            engine.update_status(f"Сверка {symbol}")
+            try:
+                results[symbol] = await verify_symbol(engine, session, symbol, start_date, end_date, interval)
+            except Exception as e:
+                logging.error(f"Ошибка сверки {symbol}: {str(e)}")
+                engine.update_status(f"Ошибка сверки {symbol}: {str(e)}")
+                return
+            for bucket_start, _, problems in results[symbol]:
+                logging.warning(f"{symbol} {bucket_start:%Y-%m-%d %H:%M}: {', '.join(problems)}")
+
+    await engine.sink.open(engine.download_threads)
+    try:
+        await engine.sink.bootstrap(selected_tickers, create=False)
+        async with engine.client_session() as session:
+            await asyncio.gather(*(run_symbol(session, symbol) for symbol in selected_tickers))
+    finally:
+        await engine.sink.close()
+    return results
+
+
+def requeue_periods(results):
+    """Несовпавшие интервалы как периоды для DownloadEngine.run_job / planner.estimate"""
+    return {
+        symbol: [(start, end) for start, end, _ in mismatches]
+        for symbol, mismatches in results.items() if mismatches
+    }
+
+
+def format_results(results):
+    lines = []
+    for symbol, mismatches in sorted(results.items()):
+        lines.append(f"{symbol}: {'не совпало интервалов: ' + str(len(mismatches)) if mismatches else 'совпадает'}")
+        for start, _, problems in mismatches:
+            lines.append(f"    {start:%Y-%m-%d %H:%M}  {', '.join(problems)}")
+    return "\n".join(lines)